@@ -0,0 +1,225 @@
+"""
+Benchmark the cost of decorating test classes with ddt.
+
+Each scenario builds a test class with one data driven method holding
+``size`` data items and decorates it with ``ddt``.  For every scenario and
+size the best wall time out of ``--repeat`` runs and the peak memory traced
+while decorating are recorded, in eager, lazy and collapsed mode.  The hot helper
+functions used while decorating are timed separately.  Results are printed
+as JSON, so that they can be compared between releases::
+
+    python benchmarks/decoration.py --sizes 100 10000 1000000 > results.json
+"""
+import argparse
+import gc
+import itertools
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import ddt  # noqa: E402
+
+SCENARIOS = {}
+
+# ddt options for each way of generating tests
+MODES = {
+    'eager': {},
+    'lazy': {'lazy': True},
+    'collapse': {'collapse': True},
+}
+
+
+def scenario(name):
+    """Register a function returning a class factory for ``size`` items"""
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def decorated(method, **options):
+    """Return a factory decorating a class holding ``method`` with ddt"""
+    def factory():
+        # Time parsing data files, as on the first import of a test module
+        ddt.invalidate_file_data()
+        cls = type('Test', (object, ), {'test_something': method()})
+        return ddt.ddt(**options)(cls)
+    return factory
+
+
+@scenario('data')
+def data_scenario(size, directory, **options):
+    values = list(range(size))
+    return decorated(lambda: ddt.data(*values)(lambda self, value: None),
+                     **options)
+
+
+@scenario('data_strings')
+def data_strings_scenario(size, directory, **options):
+    values = ['value {0}!'.format(i) for i in range(size)]
+    return decorated(lambda: ddt.data(*values)(lambda self, value: None),
+                     **options)
+
+
+@scenario('data_unpack')
+def data_unpack_scenario(size, directory, **options):
+    values = [(i, str(i), float(i)) for i in range(size)]
+    return decorated(
+        lambda: ddt.data(*values)(ddt.unpack(lambda self, a, b, c: None)),
+        **options
+    )
+
+
+@scenario('idata_generator')
+def idata_generator_scenario(size, directory, **options):
+    return decorated(
+        lambda: ddt.idata(i for i in range(size))(lambda self, value: None),
+        **options
+    )
+
+
+@scenario('idata_product')
+def idata_product_scenario(size, directory, **options):
+    side = int(math.sqrt(size))
+    return decorated(
+        lambda: ddt.idata(itertools.product(range(side), repeat=2))(
+            ddt.unpack(lambda self, a, b: None)
+        ),
+        **options
+    )
+
+
+@scenario('named_data')
+def named_data_scenario(size, directory, **options):
+    values = [['case_{0}'.format(i), i] for i in range(size)]
+    return decorated(
+        lambda: ddt.named_data(*values)(lambda self, value: None),
+        **options
+    )
+
+
+def write_file(directory, name, lines):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.writelines(lines)
+    return path
+
+
+@scenario('file_data_json')
+def file_data_json_scenario(size, directory, **options):
+    path = write_file(directory, '{0}.json'.format(size), [json.dumps(
+        dict(('case_{0}'.format(i), {'a': i, 'b': str(i)}) for i in range(size))
+    )])
+    return decorated(
+        lambda: ddt.file_data(path)(lambda self, a, b: None), **options
+    )
+
+
+@scenario('file_data_jsonl')
+def file_data_jsonl_scenario(size, directory, **options):
+    path = write_file(directory, '{0}.jsonl'.format(size), (
+        json.dumps({'a': i, 'b': str(i)}) + '\n' for i in range(size)
+    ))
+    return decorated(
+        lambda: ddt.file_data(path)(lambda self, a, b: None), **options
+    )
+
+
+def best_time(factory, repeat):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        factory()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def peak_memory(factory):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        cls = factory()
+        return tracemalloc.get_traced_memory()[1], cls
+    finally:
+        tracemalloc.stop()
+
+
+def bench_scenarios(names, sizes, repeat, directory):
+    for name in names:
+        for size in sizes:
+            for mode, options in sorted(MODES.items()):
+                factory = SCENARIOS[name](size, directory, **options)
+                peak, cls = peak_memory(factory)
+                yield {
+                    'scenario': name,
+                    'size': size,
+                    'mode': mode,
+                    'tests': sum(1 for n in vars(cls) if n.startswith('test_')),
+                    'seconds': best_time(factory, repeat),
+                    'peak_bytes': peak,
+                }
+
+
+def bench_functions(number):
+    """Time single calls of the helpers used while decorating, in ns"""
+    def func(self, value):
+        """Docstring {0}"""
+
+    nested = (1, 'a', (2.0, None, ('b', True)))
+    calls = {
+        'mk_test_name_int': lambda: ddt.mk_test_name('test', 12345, 12, 5),
+        'mk_test_name_str': lambda: ddt.mk_test_name('test', 'a b-c', 12, 5),
+        'mk_test_name_tuple': lambda: ddt.mk_test_name('test', nested, 12, 5),
+        'mk_test_name_object': lambda: ddt.mk_test_name('test', {}, 12, 5),
+        'is_trivial_nested': lambda: ddt.is_trivial(nested),
+        'feed_data': lambda: ddt.feed_data(func, 'test_1', None, 1),
+        'get_test_data_docstring': lambda: ddt._get_test_data_docstring(
+            func, nested
+        ),
+    }
+    return dict(
+        (name, min(timeit.repeat(call, number=number, repeat=3)) / number * 1e9)
+        for name, call in calls.items()
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[100, 1000, 10000])
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS),
+                        default=sorted(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--number', type=int, default=100000,
+                        help='calls per helper function timing')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        results = {
+            'ddt_version': ddt.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scenarios': list(bench_scenarios(
+                args.scenarios, args.sizes, args.repeat, directory
+            )),
+            'functions_ns': bench_functions(args.number),
+        }
+    finally:
+        shutil.rmtree(directory)
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
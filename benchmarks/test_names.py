@@ -0,0 +1,79 @@
+"""
+Benchmark the throughput of test name generation.
+
+Names are generated for the same data sequences item by item with
+``mk_test_name`` and in one batch with ``mk_test_names``, checking that both
+produce the same names.  Results are printed as JSON, in names per second::
+
+    python benchmarks/test_names.py --size 100000
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import ddt  # noqa: E402
+
+DATASETS = {
+    'int': lambda size: list(range(size)),
+    'str': lambda size: ['value {0}!'.format(i) for i in range(size)],
+    'identifier': lambda size: ['value_{0}'.format(i) for i in range(size)],
+    'tuple': lambda size: [(i, str(i), float(i)) for i in range(size)],
+    'product': lambda size: list(itertools.product(
+        [(i, 'x') for i in range(int(size ** 0.5))], repeat=2
+    )),
+    'dict': lambda size: [{'value': i} for i in range(size)],
+}
+
+
+def per_item(values, index_len):
+    return [
+        ddt.mk_test_name('test_something', value, i, index_len)
+        for i, value in enumerate(values)
+    ]
+
+
+def batch(values, index_len):
+    return ddt.mk_test_names('test_something', values, index_len)
+
+
+def best_time(func, values, repeat):
+    index_len = len(str(len(values)))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        names = func(values, index_len)
+        timings.append(time.perf_counter() - start)
+    return min(timings), names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    results = []
+    for name, make_values in sorted(DATASETS.items()):
+        values = make_values(args.size)
+        per_item_time, expected = best_time(per_item, values, args.repeat)
+        batch_time, names = best_time(batch, values, args.repeat)
+        if names != expected:
+            sys.exit('mk_test_names differs from mk_test_name for ' + name)
+        results.append({
+            'dataset': name,
+            'size': len(values),
+            'mk_test_name_per_second': len(values) / per_item_time,
+            'mk_test_names_per_second': len(values) / batch_time,
+            'speedup': per_item_time / batch_time,
+        })
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark loading YAML data files with and without libyaml.
+
+The YAML fixtures in ``test/data`` are scaled up by repeating their entries
+and then decorated with ``file_data``, once with ddt picking the libyaml
+loader as it does by default and once forced to use the pure Python loader.
+Results are printed as JSON::
+
+    python benchmarks/yaml_loader.py --sizes 1000 10000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import ddt  # noqa: E402
+
+FIXTURES = ('test_data_dict.yaml', 'test_data_dict_dict.yaml')
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'test', 'data')
+
+
+def scale_fixture(fixture, size, directory):
+    """Write ``fixture`` with its entries repeated up to ``size`` entries"""
+    with open(os.path.join(FIXTURES_DIR, fixture)) as f:
+        entries = list(yaml.safe_load(f).items())
+    scaled = dict(
+        ('{0}_{1}'.format(key, i), value)
+        for i in range(size // len(entries) + 1)
+        for key, value in entries
+    )
+    path = os.path.join(directory, '{0}_{1}'.format(size, fixture))
+    with open(path, 'w') as f:
+        yaml.safe_dump(dict(list(scaled.items())[:size]), f)
+    return path
+
+
+def decorate(path):
+    """Decorate a test class with ``file_data(path)``"""
+    ddt.invalidate_file_data()
+
+    class Test(object):
+        @ddt.file_data(path)
+        def test_something(self, **kwargs):
+            pass
+    return ddt.ddt(Test)
+
+
+def bench(path, repeat):
+    timer = timeit.Timer(lambda: decorate(path))
+    return min(timer.repeat(repeat=repeat, number=1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if not yaml.__with_libyaml__:
+        sys.exit('PyYAML was built without libyaml, nothing to compare')
+
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        for fixture in FIXTURES:
+            for size in args.sizes:
+                path = scale_fixture(fixture, size, directory)
+                libyaml = bench(path, args.repeat)
+                with_python = ddt._fast_yaml_loader
+                ddt._fast_yaml_loader = lambda loader: loader
+                try:
+                    pure_python = bench(path, args.repeat)
+                finally:
+                    ddt._fast_yaml_loader = with_python
+                results.append({
+                    'fixture': fixture,
+                    'size': size,
+                    'pure_python_seconds': pure_python,
+                    'libyaml_seconds': libyaml,
+                    'speedup': pure_python / libyaml,
+                })
+    finally:
+        shutil.rmtree(directory)
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,13 +5,32 @@
 # DDT is licensed under the MIT License, included in
 # https://github.com/datadriventests/ddt/blob/master/LICENSE.md
 
-import codecs
+import atexit
+import csv
+import fnmatch
+import glob
+import hashlib
+import heapq
+import importlib
 import inspect
+import io
 import json
 import os
+import pickle
 import re
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from array import array
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from enum import Enum, unique
-from functools import wraps
+from functools import lru_cache, partial, update_wrapper, wraps
 
 try:
     import yaml
@@ -20,6 +39,14 @@ except ImportError:  # pragma: no cover
 else:
     _have_yaml = True
 
+try:
+    from orjson import loads as _fast_json_loads
+except ImportError:  # pragma: no cover
+    try:
+        from ujson import loads as _fast_json_loads
+    except ImportError:
+        _fast_json_loads = None
+
 from collections.abc import Sequence
 
 
@@ -34,6 +61,114 @@ FILE_ATTR = '%file_path'           # store the path to JSON file
 YAML_LOADER_ATTR = '%yaml_loader'  # store custom yaml loader for serialization
 UNPACK_ATTR = '%unpack'            # remember that we have to unpack values
 INDEX_LEN = '%index_len'           # store the index length of the data
+CONCURRENCY_ATTR = '%concurrency'  # store the limit of concurrent test cases
+CASE_ATTR = '%case'                # store the method and index of a test case
+COLLAPSE_ATTR = '%collapse'        # remember to run the data items as subtests
+BATCH_ATTR = '%batch'              # store the size of batches of data items
+BATCH_NAMES_ATTR = '%batch_names'  # store the test names of a running batch
+COLUMNS_ATTR = '%columns'          # store the types of the columns of a table
+KEY_COLUMN_ATTR = '%key_column'    # store the column naming the rows of a table
+SQLITE_ATTR = '%sqlite'            # store the database and query of the data
+PROCESSES_ATTR = '%processes'      # remember to load data files in processes
+
+# Data files with these extensions hold one JSON document per line and are
+# streamed by `file_data` rather than loaded in one go.
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+# Data files with these extensions are tables read with the given ``csv``
+# dialect and streamed by `file_data` one row at a time.
+CSV_DIALECTS = {'.csv': 'excel', '.tsv': 'excel-tab'}
+
+# Case stores written by ``make_case_store`` start with this header: a magic
+# string, the version of the format and the length of the index that
+# follows.  The index is a pickled tuple of the names of the items and of
+# the offsets of their pickled values, which come after it.
+CASE_STORE_EXTENSION = '.ddtcases'
+_case_store_header = struct.Struct('<8sHQ')
+_case_store_magic = b'DDTCASES'
+_case_store_version = 1
+
+# Compressed data files, recognized by their magic bytes, are decompressed
+# while they are read.  Their format is given by the extension before the
+# one of the compression, e.g. ``.json.gz``.  The modules decompressing them
+# are only imported when needed, to keep importing ``ddt`` fast.
+_compressions = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'lzma'),
+)
+COMPRESSION_EXTENSIONS = ('.gz', '.bz2', '.xz')
+
+# Environment variables configuring the on-disk cache of parsed data files.
+# The cache is only used if a cache directory is given.  Entries are keyed on
+# the content of the data file and evicted least recently used first once
+# the cache grows beyond its maximum size in bytes.
+CACHE_DIR_ENV = 'DDT_CACHE_DIR'
+CACHE_SIZE_ENV = 'DDT_CACHE_SIZE'
+CACHE_DEFAULT_SIZE = 256 * 1024 * 1024
+
+# Environment variable with the maximum number of data files whose parsed
+# data is kept in memory, to be shared by all the methods and classes using
+# them.  Sharing is off by default.  See ``invalidate_file_data``.
+INTERN_SIZE_ENV = 'DDT_INTERN_SIZE'
+INTERN_DEFAULT_SIZE = 0
+_interned_data = OrderedDict()
+_intern_lock = threading.Lock()
+_source_dirs = {}
+
+# Environment variable selecting the shard of data driven tests to generate,
+# as ``index/count``.  See the ``shard`` argument of ``ddt``.
+SHARD_ENV = 'DDT_SHARD'
+
+# Environment variable with the path of a timings file written by
+# ``record_timings`` in a previous run, which shards and orders generated
+# tests by duration.  See the ``durations`` argument of ``ddt``.
+DURATIONS_ENV = 'DDT_DURATIONS'
+_history_cache = {}
+_shard_assignments = {}
+
+# Environment variables with the path of a file the outcome of generated
+# tests is recorded in, see ``record_failures``, and turning on generating
+# only the tests that did not pass last time, see ``ddt``.
+FAILURES_ENV = 'DDT_FAILURES'
+FAILED_ONLY_ENV = 'DDT_FAILED_ONLY'
+_failures_path = None
+_failures_paths = set()
+_test_outcomes = {}
+
+# Environment variables with the path of a file generated tests that pass
+# are recorded in, to skip them while their data and code are unchanged,
+# and a version mixed in the digest of these.  See ``cache_results``.
+RESULT_CACHE_ENV = 'DDT_RESULT_CACHE'
+RESULT_CACHE_SALT_ENV = 'DDT_RESULT_CACHE_SALT'
+_result_cache_config = None
+_result_cache_paths = set()
+_test_results = {}
+
+# Environment variable with comma-separated patterns the names of generated
+# tests must match.  See the ``test_name_patterns`` argument of ``ddt``.
+TEST_NAME_PATTERNS_ENV = 'DDT_TEST_NAME_PATTERNS'
+_test_name_patterns = None
+
+# Environment variables turning on the recording of test timings, see
+# ``record_timings``.
+TIMINGS_ENV = 'DDT_TIMINGS'
+TIMINGS_MEMORY_ENV = 'DDT_TIMINGS_MEMORY'
+TIMING_FIELDS = (
+    'module', 'class', 'test', 'method', 'index', 'data_file', 'outcome',
+    'wall_seconds', 'cpu_seconds', 'peak_memory_bytes',
+)
+_timings_config = None
+_timings_paths = set()
+_timing_records = []
+
+# Environment variable with the path of a file decoration-time profiling
+# events are appended to, as JSON Lines.  See ``add_profile_listener``.
+PROFILE_ENV = 'DDT_PROFILE'
+_profile_listeners = []
+
+# CPU time of the current thread, where supported
+_cpu_time = getattr(time, 'thread_time', time.process_time)
 
 
 # These are helper classes for @named_data that allow ddt tests to have meaningful names.
@@ -63,6 +198,19 @@ try:
 except NameError:
     trivial_types += (str, )
 
+# Most values are of one of these types, which is cheaper to check exactly.
+_exact_trivial_types = frozenset((type(None), bool, int, float, str))
+
+# Characters to replace to turn a test name into a valid python identifier
+_invalid_identifier_chars = re.compile(r'\W|^(?=\d)')
+_non_word_chars = re.compile(r'\W')
+
+# Characters making a ``file_data`` path a glob pattern
+_glob_magic = re.compile(r'[*?[]')
+
+# Named parameters of a ``sqlite_data`` query selecting the rows of a shard
+_shard_params = re.compile(r':shard_(?:index|count)\b')
+
 
 @unique
 class TestNameFormat(Enum):
@@ -142,7 +290,8 @@ def idata(iterable, index_len=None):
     return wrapper
 
 
-def file_data(value, yaml_loader=None):
+def file_data(value, yaml_loader=None, columns=None, key_column=None,
+              processes=False):
     """
     Method decorator to add to your test methods.
 
@@ -160,18 +309,283 @@ def file_data(value, yaml_loader=None):
     In case of a dict, keys will be used as suffixes to the name of the
     test case, and values will be fed as test data.
 
+    Files ending with ``.jsonl`` or ``.ndjson`` are read as JSON Lines: each
+    non-blank line holds one JSON document, which is treated like an item of
+    a list.  These files are streamed one record at a time instead of being
+    loaded into memory as a whole.
+
+    Files ending with ``.csv`` or ``.tsv`` are streamed one row at a time
+    with the ``csv`` module.  The first row names the columns, and each
+    other row is fed to the test as keyword arguments, like the items of a
+    dict.  Cells are strings unless ``columns`` maps the name of their
+    column to a type or function converting them, e.g. ``{'count': int}``.
+    If ``key_column`` is given, tests are named after the value of this
+    column rather than after their index only.
+
+    Files compressed with gzip, bzip2 or xz are decompressed while they are
+    read, JSON Lines files included.  The format of a compressed file is
+    given by the extension before ``.gz``, ``.bz2`` or ``.xz``, e.g. a
+    ``.yaml.bz2`` file holds YAML.
+
+    Other file formats can be supported with ``register_decoder``.
+
+    If the ``DDT_INTERN_SIZE`` environment variable is set, the data of a
+    file loaded as a whole is parsed once and shared by all the methods and
+    classes using the file, see ``invalidate_file_data``.
+
+    ``value`` can also be a glob pattern, where ``**`` matches any number of
+    directories, or a directory, standing for all the data files under it.
+    The tests of all the files are generated, in the order of their paths,
+    with the path of each file relative to the directory the pattern starts
+    from, minus its extension, inserted after the name of the test method:
+    ``cases/a/b.json`` gives ``test_something_a_b_1_...`` for the pattern
+    ``cases/**/*.json``.  If files give the same test names, e.g.
+    ``a_b.json`` and ``a/b.json``, an error test reports them instead of
+    the tests generated last.  The files that are loaded as a whole are
+    loaded concurrently, in a pool of threads or, if ``processes`` is true,
+    in a pool of processes, which scales with cores when parsing is the
+    bottleneck but requires custom decoders and YAML loaders to be
+    picklable.
+
     ``yaml_loader`` can be used to customize yaml deserialization.
-    The default is ``None``, which results in using the ``yaml.safe_load``
-    method.
+    The default is ``None``, which results in using ``yaml.SafeLoader``.
+    If PyYAML was built with libyaml, PyYAML's loaders are replaced by their
+    faster C equivalents, e.g. ``yaml.CSafeLoader`` for ``yaml.SafeLoader``.
     """
     def wrapper(func):
         setattr(func, FILE_ATTR, value)
         if yaml_loader:
             setattr(func, YAML_LOADER_ATTR, yaml_loader)
+        if columns:
+            setattr(func, COLUMNS_ATTR, columns)
+        if key_column:
+            setattr(func, KEY_COLUMN_ATTR, key_column)
+        if processes:
+            setattr(func, PROCESSES_ATTR, processes)
+        return func
+    return wrapper
+
+
+def sqlite_data(path, query, params=None, key_column=None, batch_size=1000):
+    """
+    Method decorator feeding the rows returned by a query on a SQLite
+    database to a test, as keyword arguments named after the columns.
+
+    ``path`` is relative to the directory of the file containing the
+    decorated ``unittest.TestCase``, as for ``file_data``.  ``params`` are
+    bound to the placeholders of ``query``.  Rows are fetched from the
+    cursor ``batch_size`` at a time, and tests are named after the value of
+    ``key_column`` if given, or after their index only.  For example:
+
+    .. code-block:: python
+
+        @sqlite_data('cases.db', 'SELECT * FROM cases WHERE suite = :suite',
+                     {'suite': 'regression'}, key_column='name')
+        def test_case(self, name, input, expected):
+            ...
+
+    When tests are sharded (see ``ddt``), a query using the named
+    parameters ``:shard_index`` and ``:shard_count`` selects the rows of
+    the shard itself, e.g. with ``WHERE id % :shard_count = :shard_index``,
+    and its tests are not sharded again by name.  ``params`` must then be a
+    dict, if given.  Without sharding, the parameters are 0 and 1.
+
+    The query runs twice, once to count its rows and once to fetch them, so
+    it should not have side effects.
+    """
+    def wrapper(func):
+        # The query is run as a subquery, which cannot end with a semicolon
+        statement = query.rstrip().rstrip(';')
+        setattr(func, SQLITE_ATTR, (path, statement, params, batch_size))
+        if key_column:
+            setattr(func, KEY_COLUMN_ATTR, key_column)
+        return func
+    return wrapper
+
+
+def batch(size=None):
+    """
+    Method decorator to pass the data items of a test to it in batches.
+
+    Instead of generating one test method per data item, a test method is
+    generated per batch of ``size`` data items, or a single one for all the
+    data items if ``size`` is not given.  The data items of a batch are
+    passed column-wise: each argument the test would take for a single data
+    item is passed as the list of its values for all the data items of the
+    batch.  This lets tests check many data items with a single, vectorized
+    call of the code under test.  For example:
+
+    .. code-block:: python
+
+        @batch(size=1000)
+        @data((1, 2), (2, 4), (3, 6))
+        @unpack
+        def test_double(self, values, expected):
+            check_batch(self, double(values) == expected)
+
+    Use ``check_batch`` to report the data items a batch fails for, or
+    ``batch_case_names`` to get the names of the tests that would have been
+    generated for the data items of the batch.
+
+    """
+    def wrapper(func):
+        setattr(func, BATCH_ATTR, size)
+        return func
+    return wrapper
+
+
+def batch_case_names(test):
+    """
+    Return the names of the test cases of the batch that a test case
+    instance generated by ``@batch`` is running, in the order of the data
+    items of the batch.
+    """
+    try:
+        return getattr(test, BATCH_NAMES_ATTR)
+    except AttributeError:
+        raise TypeError("{0!r} is not running a batch".format(test))
+
+
+def check_batch(test, outcomes, msg=None):
+    """
+    Report the data items of a batch that failed as subtests.
+
+    ``outcomes`` holds one value per data item of the batch the test case
+    instance ``test`` is running, and a data item failed if its value is
+    false.  Each failed data item is reported as a failed subtest of
+    ``test``, labelled with the name of the test case of the data item, as
+    returned by ``batch_case_names``.
+    """
+    names = batch_case_names(test)
+    outcomes = list(outcomes)
+    if len(outcomes) != len(names):
+        raise ValueError(
+            "Got {0} outcomes for a batch of {1} data items".format(
+                len(outcomes), len(names)
+            )
+        )
+    for name, outcome in zip(names, outcomes):
+        if not outcome:
+            with test.subTest(name):
+                test.fail(msg or "{0} failed".format(name))
+
+
+def collapse(func):
+    """
+    Method decorator to run the data items of a test as subtests.
+
+    Instead of generating one test method per data item, the decorated
+    method stays a single test method, which runs the test with every data
+    item in turn within ``self.subTest``.  Subtests are labelled with the
+    names the generated test methods would have had.  This avoids the cost
+    of generating, loading and setting up a test case per data item, which
+    is worthwhile for large numbers of cheap test cases.
+
+    """
+    setattr(func, COLLAPSE_ATTR, True)
+    return func
+
+
+def concurrently(limit=None):
+    """
+    Method decorator to run the tests generated for a method concurrently.
+
+    Should be added to data driven test methods.  The first of the generated
+    tests to be run runs all of them that have been loaded concurrently, at
+    most ``limit`` at a time if ``limit`` is given, and records their
+    outcome.  Each generated
+    test then reports its own outcome, so that failures are still reported
+    for each data item separately, while the total run time is bounded by
+    the slowest test rather than by the sum of all of them.
+
+    Test cases of ``async def`` methods run on the event loop of the first
+    generated test to be run.  Test cases of other methods run in a pool of
+    ``limit`` threads, or of as many threads as ``ThreadPoolExecutor`` uses
+    by default if ``limit`` is not given.
+
+    All the test cases run with the test case instance, including anything
+    set up by ``setUp``, of the generated test that was run first.
+    """
+    def wrapper(func):
+        setattr(func, CONCURRENCY_ATTR, limit)
         return func
     return wrapper
 
 
+def register_decoder(extensions, decoder):
+    """
+    Register a decoder for ``file_data`` files with the given extensions.
+
+    ``extensions`` is a file extension such as ``'.msgpack'``, or a sequence
+    of them.  ``decoder`` is called with the data file opened in binary mode
+    and must return the decoded data, a list or a dict.  If a loader has been
+    passed to ``file_data``, it is passed to the decoder as second argument.
+    For example:
+
+    .. code-block:: python
+
+        register_decoder('.msgpack', lambda f: msgpack.unpack(f, raw=False))
+
+    Registering an extension again replaces its decoder.  Files with an
+    extension no decoder is registered for are decoded as JSON.
+    """
+    if isinstance(extensions, str):
+        extensions = (extensions, )
+    for extension in extensions:
+        _decoders[extension] = decoder
+
+
+def _get_decoder(path):
+    """
+    Return the decoder registered for the extension of a data file
+    """
+    return _decoders.get(_data_file_extension(path), _decode_json)
+
+
+def _data_file_extension(path):
+    """
+    Return the extension giving the format of a possibly compressed data file
+    """
+    root, extension = os.path.splitext(path)
+    if extension in COMPRESSION_EXTENSIONS:
+        extension = os.path.splitext(root)[1]
+    return extension
+
+
+def _compression(header):
+    """
+    Return the function opening files compressed with the format recognized
+    by the first bytes of a file, or ``None`` if it is not compressed
+    """
+    for magic, module in _compressions:
+        if header.startswith(magic):
+            return importlib.import_module(module).open
+    return None
+
+
+def _decompressed(stream):
+    """
+    Return a stream decompressing a buffered binary stream if it is
+    compressed, and the stream itself otherwise
+    """
+    open_compressed = _compression(stream.peek(6))
+    return open_compressed(stream) if open_compressed else stream
+
+
+@contextmanager
+def _open_data_file(path):
+    """
+    Open a data file in binary mode, decompressing it on the fly if needed
+    """
+    with open(path, 'rb') as f, _decompressed(f) as stream:
+        yield stream
+
+
+def _is_compressed(path):
+    with open(path, 'rb') as f:
+        return _compression(f.read(6)) is not None
+
+
 def mk_test_name(name, value, index=0, index_len=5, name_fmt=TestNameFormat.DEFAULT):
     """
     Generate a new name for a test case.
@@ -197,13 +611,91 @@ def mk_test_name(name, value, index=0, index_len=5, name_fmt=TestNameFormat.DEFA
     index = "{0:0{1}}".format(index + 1, index_len)
     if name_fmt is TestNameFormat.INDEX_ONLY or not is_trivial(value):
         return "{0}_{1}".format(name, index)
+    test_name = "{0}_{1}_{2}".format(name, index, _value_str(value))
+    return _invalid_identifier_chars.sub('_', test_name)
+
+
+def mk_test_names(name, values, index_len=None,
+                  name_fmt=TestNameFormat.DEFAULT):
+    """
+    Generate the names of the test cases for a whole sequence of values.
+
+    This returns the same names as calling ``mk_test_name`` for each value
+    and its index in ``values``, but is much faster for large sequences.  If
+    ``index_len`` is not given, indices are zero-padded to the length of the
+    largest one.
+    """
+    if index_len is None:
+        values = tuple(values)
+        index_len = len(str(len(values)))
+    namer = _TestNamer(name, index_len, name_fmt)
+    return [namer(value, i) for i, value in enumerate(values)]
+
+
+def _value_str(value):
     try:
-        value = str(value)
+        return str(value)
     except UnicodeEncodeError:
         # fallback for python2
-        value = value.encode('ascii', 'backslashreplace')
-    test_name = "{0}_{1}_{2}".format(name, index, value)
-    return re.sub(r'\W|^(?=\d)', '_', test_name)
+        return value.encode('ascii', 'backslashreplace')
+
+
+class _TestNamer(object):
+    """
+    Generate test names like ``mk_test_name`` for the values of one method.
+
+    Everything that only depends on the method is worked out once, and the
+    triviality of the items of container values is remembered, so that
+    repeated sub-values (e.g. from ``itertools.product``) are only checked
+    once.
+    """
+
+    def __init__(self, name, index_len, name_fmt=TestNameFormat.DEFAULT):
+        self.name = name
+        self.index_fmt = "{0}_%0{1}d".format(name.replace('%', '%%'),
+                                             index_len)
+        self.index_only = name_fmt is TestNameFormat.INDEX_ONLY
+        # The name of the test method is normally a valid identifier, in
+        # which case only the value part of test names needs sanitizing.
+        self.valid_name = not _invalid_identifier_chars.search(name)
+        self.trivial = {}
+
+    def __call__(self, value, index):
+        prefix = self.index_name(index)
+        if self.index_only or not self.is_trivial(value):
+            return prefix
+        value = _value_str(value)
+        if not self.valid_name:
+            return _invalid_identifier_chars.sub(
+                '_', "{0}_{1}".format(prefix, value)
+            )
+        if not value.isalnum():
+            value = _non_word_chars.sub('_', value)
+        return "{0}_{1}".format(prefix, value)
+
+    def index_name(self, index):
+        """Return the name of a test whose value is not trivial"""
+        return self.index_fmt % (index + 1)
+
+    def is_trivial(self, value):
+        if type(value) in _exact_trivial_types:
+            return True
+        if not isinstance(value, (list, tuple)):
+            return isinstance(value, trivial_types)
+        return isinstance(value, trivial_types) or \
+            all(map(self._is_trivial_item, value))
+
+    def _is_trivial_item(self, value):
+        if type(value) in _exact_trivial_types:
+            return True
+        try:
+            return self.trivial[id(value)][1]
+        except KeyError:
+            pass
+        trivial = self.is_trivial(value)
+        # Keep a reference to the value so that its id is not reused
+        self.trivial[id(value)] = (value, trivial)
+        return trivial
 
 
 def feed_data(func, new_name, test_data_docstring, *args, **kwargs):
@@ -251,219 +743,2247 @@ def add_test(cls, test_name, test_docstring, func, *args, **kwargs):
             *args, **kwargs))
 
 
-def process_file_data(cls, name, func, file_attr):
-    """
-    Process the parameter in the `file_data` decorator.
+class _GeneratedTest(object):
     """
-    cls_path = os.path.abspath(inspect.getsourcefile(cls))
-    data_file_path = os.path.join(os.path.dirname(cls_path), file_attr)
+    A test case that has been generated from a data item but not yet built.
 
-    def create_error_func(message):  # pylint: disable-msg=W0613
-        def func(*args):
-            raise ValueError(message % file_attr)
-        return func
+    It holds just enough information to call ``feed_data`` later on. When
+    placed on a class by ``@ddt(lazy=True)`` it acts as a placeholder for the
+    real test method, which is only built (and cached on the class) the
+    first time it is looked up from a test case instance.
+    """
+    __slots__ = ('func', 'method', 'index', 'name', 'doc', 'args', 'kwargs')
 
-    # If file does not exist, provide an error function instead
-    if not os.path.exists(data_file_path):
-        test_name = mk_test_name(name, "error")
-        test_docstring = """Error!"""
-        add_test(cls, test_name, test_docstring,
-                 create_error_func("%s does not exist"), None)
-        return
+    def __init__(self, func, method, index, name, doc, args=(), kwargs=None):
+        self.func = func
+        self.method = method
+        self.index = index
+        self.name = name
+        self.doc = doc
+        self.args = args
+        self.kwargs = kwargs or {}
+
+    def build(self):
+        test = self._build()
+        setattr(test, CASE_ATTR, (self.method, self.index))
+        timings = _get_timings_config()
+        if timings is not None:
+            test = _timed_test(test, self, *timings)
+        failures = _get_failures_path()
+        if failures is not None:
+            test = _outcome_recording_test(test, failures)
+        result_cache = _get_result_cache_config()
+        if result_cache is not None:
+            test = _result_caching_test(test, self, *result_cache)
+        return test
+
+    def _build(self):
+        args, kwargs = self._arguments()
+        return feed_data(self.func, self.name, self.doc, *args, **kwargs)
+
+    def _arguments(self):
+        return self.args, self.kwargs
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            # Looking the test up on the class (e.g. the test loader checking
+            # that it is callable) does not need the real method yet.
+            return self
+        return self._materialize(owner).__get__(instance, owner)
+
+    def __call__(self, instance, *args, **kwargs):
+        return self._materialize(type(instance))(instance, *args, **kwargs)
+
+    @property
+    def __wrapped__(self):
+        return self.func
+
+    def _materialize(self, owner):
+        test = self.build()
+        for klass in owner.__mro__:
+            if klass.__dict__.get(self.name) is self:
+                setattr(klass, self.name, test)
+                break
+        return test
+
+
+def record_timings(path, memory=False):
+    """
+    Record how long each test generated by ``ddt`` takes to run.
+
+    Applies to the tests built from now on.  For every run of a generated
+    test, the wall time and CPU time it takes are recorded, together with
+    the test's class, name, data driven method, data item index and data
+    file, if any.  If ``memory`` is true, the peak memory allocated while the
+    test runs is traced with ``tracemalloc`` as well, which slows tests
+    down and is only accurate for tests that do not run concurrently.
+
+    The records are written to ``path`` when the process exits, as CSV if
+    ``path`` ends with ``.csv`` and as JSON otherwise.  ``{pid}`` in
+    ``path`` is replaced by the id of the process, to keep the records of
+    test processes running in parallel apart.  Recording can also be turned
+    on by setting the ``DDT_TIMINGS`` environment variable to the path, and
+    ``DDT_TIMINGS_MEMORY`` to trace memory.  Passing ``None`` as ``path``
+    goes back to following these environment variables.
+    """
+    global _timings_config
+    _timings_config = (path, memory) if path else None
 
-    _is_yaml_file = data_file_path.endswith((".yml", ".yaml"))
 
-    # Don't have YAML but want to use YAML file.
-    if _is_yaml_file and not _have_yaml:
-        test_name = mk_test_name(name, "error")
-        test_docstring = """Error!"""
-        add_test(
-            cls,
-            test_name,
-            test_docstring,
-            create_error_func("%s is a YAML file, please install PyYAML"),
-            None
-        )
-        return
+def write_timings(path):
+    """
+    Write the test timings recorded so far to ``path``, as CSV if ``path``
+    ends with ``.csv`` and as JSON otherwise.
+    """
+    path = path.replace('{pid}', str(os.getpid()))
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, TIMING_FIELDS)
+            writer.writeheader()
+            writer.writerows(_timing_records)
+    else:
+        with open(path, 'w') as f:
+            json.dump(_timing_records, f, indent=2)
 
-    with codecs.open(data_file_path, 'r', 'utf-8') as f:
-        # Load the data from YAML or JSON
-        if _is_yaml_file:
-            if hasattr(func, YAML_LOADER_ATTR):
-                yaml_loader = getattr(func, YAML_LOADER_ATTR)
-                data = yaml.load(f, Loader=yaml_loader)
-            else:
-                data = yaml.safe_load(f)
-        else:
-            data = json.load(f)
 
-    _add_tests_from_data(cls, name, func, data)
+def _get_timings_config():
+    if _timings_config is not None:
+        return _timings_config
+    path = os.environ.get(TIMINGS_ENV)
+    if not path:
+        return None
+    return path, bool(os.environ.get(TIMINGS_MEMORY_ENV))
 
 
-def _add_tests_from_data(cls, name, func, data):
+def _timed_test(test, generated, path, memory=False):
     """
-    Add tests from data loaded from the data file into the class
+    Wrap a generated test method to record how long it takes to run
     """
-    index_len = len(str(len(data)))
-    for i, elem in enumerate(data):
-        if isinstance(data, dict):
-            key, value = elem, data[elem]
-            test_name = mk_test_name(name, key, i, index_len)
-        elif isinstance(data, list):
-            value = elem
-            test_name = mk_test_name(name, value, i, index_len)
-        if isinstance(value, dict):
-            add_test(cls, test_name, test_name, func, **value)
-        else:
-            add_test(cls, test_name, test_name, func, value)
+    if path not in _timings_paths:
+        _timings_paths.add(path)
+        atexit.register(write_timings, path)
+    return _wrap_test(test, partial(
+        _record_timing, generated.name, generated.method, generated.index,
+        getattr(generated.func, FILE_ATTR, None), memory
+    ))
 
 
-def _is_primitive(obj):
-    """Finds out if the obj is a "primitive". It is somewhat hacky but it works.
+def _wrap_test(test, context):
     """
-    return not hasattr(obj, '__dict__')
+    Wrap a test method to run it in the context manager ``context(self)``
+    """
+    if inspect.iscoroutinefunction(test):
+        @wraps(test)
+        async def wrapped(self):
+            with context(self):
+                return await test(self)
+    else:
+        @wraps(test)
+        def wrapped(self):
+            with context(self):
+                return test(self)
+    return wrapped
+
+
+@contextmanager
+def _record_timing(name, method, index, data_file, memory, instance):
+    if memory:
+        import tracemalloc
+
+        # Leave tracing started by others, e.g. with ``-X tracemalloc``,
+        # running, and only count the memory allocated by the test
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    outcome = 'success'
+    wall, cpu = time.perf_counter(), _cpu_time()
+    try:
+        yield
+    except BaseException as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        wall, cpu = time.perf_counter() - wall, _cpu_time() - cpu
+        peak = None
+        if memory:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            if started:
+                tracemalloc.stop()
+        cls = type(instance)
+        _timing_records.append({
+            'module': cls.__module__,
+            'class': cls.__qualname__,
+            'test': name,
+            'method': method,
+            'index': index,
+            'data_file': data_file,
+            'outcome': outcome,
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'peak_memory_bytes': peak,
+        })
+
+
+def record_failures(path):
+    """
+    Record which tests generated by ``ddt`` fail in the state file ``path``.
+
+    Applies to the tests built from now on.  The state file is a JSON object
+    mapping the full name (``module.Class.test_name``) of each test that ran
+    to ``"failed"`` or ``"passed"``.  It is updated when the process exits,
+    keeping the outcomes recorded for the tests that did not run this time.
+    Skipped tests are not recorded.  Recording can also be turned on by
+    setting the ``DDT_FAILURES`` environment variable to the path, and
+    passing ``None`` as ``path`` goes back to following it.
+
+    Use ``HistoryTestLoader`` to run the tests that failed last time first,
+    and the ``failed_only`` argument of ``ddt`` to only generate them.
+    """
+    global _failures_path
+    _failures_path = path
 
 
-def _get_test_data_docstring(func, value):
-    """Returns a docstring based on the following resolution strategy:
-    1. Passed value is not a "primitive" and has a docstring, then use it.
-    2. In all other cases return None, i.e the test name is used.
+def write_failures(path):
     """
-    if not _is_primitive(value) and value.__doc__:
-        return value.__doc__
-    else:
-        return None
+    Merge the test outcomes recorded so far into the state file ``path``
+    """
+    outcomes = dict(_load_outcomes(path))
+    outcomes.update(_test_outcomes)
+    _write_json(path, outcomes)
 
 
-def ddt(arg=None, **kwargs):
+def _write_json(path, obj):
+    directory = os.path.dirname(os.path.abspath(path))
+    # Replace the file at once so that a test process reading it never
+    # sees it partially written.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(obj, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _get_failures_path():
+    if _failures_path is not None:
+        return _failures_path
+    return os.environ.get(FAILURES_ENV) or None
+
+
+def _load_outcomes(path):
+    return _read_history(path, json.load) or {}
+
+
+def _outcome_recording_test(test, path):
     """
-    Class decorator for subclasses of ``unittest.TestCase``.
+    Wrap a generated test method to record whether it passes
+    """
+    if path not in _failures_paths:
+        _failures_paths.add(path)
+        atexit.register(write_failures, path)
+    return _wrap_test(test, _record_outcome)
 
-    Apply this decorator to the test case class, and then
-    decorate test methods with ``@data``.
 
-    For each method decorated with ``@data``, this will effectively create as
-    many methods as data items are passed as parameters to ``@data``.
+def _full_test_name(instance):
+    cls = type(instance)
+    return '{0}.{1}.{2}'.format(cls.__module__, cls.__qualname__,
+                                instance._testMethodName)
 
-    The names of the test methods follow the pattern
-    ``original_test_name_{ordinal}_{data}``. ``ordinal`` is the position of the
-    data argument, starting with 1.
 
-    For data we use a string representation of the data value converted into a
-    valid python identifier.  If ``data.__name__`` exists, we use that instead.
+def _subtests_passed(instance):
+    """
+    Return whether the subtests a test case instance ran so far passed
 
-    For each method decorated with ``@file_data('test_data.json')``, the
-    decorator will try to load the test_data.json file located relative
-    to the python file containing the method that is decorated. It will,
-    for each ``test_name`` key create as many methods in the list of values
-    from the ``data`` key.
+    Failed subtests, e.g. reported by ``check_batch``, do not raise out of
+    the test method but are recorded on the outcome of the running test.
+    """
+    outcome = getattr(instance, '_outcome', None)
+    return outcome is None or outcome.success
 
-    Decorating with the keyword argument ``testNameFormat`` can control the
-    format of the generated test names.  For example:
 
-    - ``@ddt(testNameFormat=TestNameFormat.DEFAULT)`` will be index and values.
+@contextmanager
+def _record_outcome(instance):
+    name = _full_test_name(instance)
+    try:
+        yield
+    except unittest.SkipTest:
+        raise
+    except BaseException:
+        _test_outcomes[name] = 'failed'
+        raise
+    _test_outcomes[name] = 'passed' if _subtests_passed(instance) \
+        else 'failed'
 
-    - ``@ddt(testNameFormat=TestNameFormat.INDEX_ONLY)`` will be index only.
 
-    - ``@ddt`` is the same as DEFAULT.
+def cache_results(path, salt=''):
+    """
+    Skip the tests generated by ``ddt`` that passed before with the same
+    data and code.
+
+    Applies to the tests built from now on.  When a test passes, a digest
+    of its data item, of the source code of its data driven method and of
+    ``salt`` is recorded in the JSON file ``path`` when the process exits.
+    The test is then reported as skipped as long as the digest is the same.
+    As code called by the test is not part of the digest, change ``salt``
+    (e.g. to a hash of the code under test) to run all tests again.  Data
+    items whose ``repr`` differs between runs, like objects without a
+    ``__repr__``, and methods whose source cannot be found are always run.
+
+    The cache can also be turned on by setting the ``DDT_RESULT_CACHE``
+    environment variable to the path, and ``DDT_RESULT_CACHE_SALT`` to the
+    salt.  Passing ``None`` as ``path`` goes back to following these.
+    """
+    global _result_cache_config
+    _result_cache_config = (path, salt) if path else None
 
+
+def write_result_cache(path):
     """
-    fmt_test_name = kwargs.get("testNameFormat", TestNameFormat.DEFAULT)
+    Merge the tests that passed or failed so far into the result cache file
+    ``path``
+    """
+    results = dict(_read_history(path, json.load) or {})
+    results.update(_test_results)
+    _write_json(path, {name: digest for name, digest in results.items()
+                       if digest is not None})
 
-    def wrapper(cls):
-        for name, func in list(cls.__dict__.items()):
-            if hasattr(func, DATA_ATTR):
-                index_len = getattr(func, INDEX_LEN)
-                for i, v in enumerate(getattr(func, DATA_ATTR)):
-                    test_name = mk_test_name(
-                        name,
-                        getattr(v, "__name__", v),
-                        i,
-                        index_len,
-                        fmt_test_name
-                    )
-                    test_data_docstring = _get_test_data_docstring(func, v)
-                    if hasattr(func, UNPACK_ATTR):
-                        if isinstance(v, tuple) or isinstance(v, list):
-                            add_test(
-                                cls,
-                                test_name,
-                                test_data_docstring,
-                                func,
-                                *v
-                            )
-                        else:
-                            # unpack dictionary
-                            add_test(
-                                cls,
-                                test_name,
-                                test_data_docstring,
-                                func,
-                                **v
-                            )
-                    else:
-                        add_test(cls, test_name, test_data_docstring, func, v)
-                delattr(cls, name)
-            elif hasattr(func, FILE_ATTR):
-                file_attr = getattr(func, FILE_ATTR)
-                process_file_data(cls, name, func, file_attr)
-                delattr(cls, name)
-        return cls
 
-    # ``arg`` is the unittest's test class when decorating with ``@ddt`` while
-    # it is ``None`` when decorating a test class with ``@ddt(k=v)``.
-    return wrapper(arg) if inspect.isclass(arg) else wrapper
+def _get_result_cache_config():
+    if _result_cache_config is not None:
+        return _result_cache_config
+    path = os.environ.get(RESULT_CACHE_ENV)
+    if not path:
+        return None
+    return path, os.environ.get(RESULT_CACHE_SALT_ENV, '')
 
 
-def named_data(*named_values):
+def _result_caching_test(test, generated, path, salt=''):
     """
-    This decorator is to allow for meaningful names to be given to tests that would otherwise use @ddt.data and
-    @ddt.unpack.
+    Wrap a generated test method to skip it if it passed before with the
+    same data and code
+    """
+    source = _source(generated.func)
+    if source is None:
+        return test
+    digest = hashlib.sha1(source.encode('utf-8'))
+    digest.update(repr((generated._arguments(), salt)).encode('utf-8'))
+    if path not in _result_cache_paths:
+        _result_cache_paths.add(path)
+        atexit.register(write_result_cache, path)
+    return _wrap_test(test, partial(_cached_result, path, digest.hexdigest()))
+
+
+@lru_cache(maxsize=None)
+def _source(func):
+    try:
+        return inspect.getsource(inspect.unwrap(func))
+    except (OSError, TypeError):
+        return None
 
-    Example of original ddt usage:
-        @ddt.ddt
-        class TestExample(TemplateTest):
-            @ddt.data(
-                [0, 1],
-                [10, 11]
-            )
-            @ddt.unpack
-            def test_values(self, value1, value2):
-                ...
 
-    Example of new usage:
-        @ddt.ddt
-        class TestExample(TemplateTest):
-            @named_data(
-                ['LabelA', 0, 1],
-                ['LabelB', 10, 11],
-            )
-            def test_values(self, value1, value2):
-                ...
+@contextmanager
+def _cached_result(path, digest, instance):
+    name = _full_test_name(instance)
+    if (_read_history(path, json.load) or {}).get(name) == digest:
+        raise unittest.SkipTest('passed before with the same data and code')
+    try:
+        yield
+    except unittest.SkipTest:
+        raise
+    except BaseException:
+        _test_results[name] = None
+        raise
+    _test_results[name] = digest if _subtests_passed(instance) else None
 
-    Note that @unpack is not used.
 
-    :param Sequence[Any] | dict[Any,Any] named_values: Each named_value should be a Sequence (e.g. list or tuple) with
-        the name as the first element, or a dictionary with 'name' as one of the keys. The name will be coerced to a
-        string and all other values will be passed unchanged to the test.
+def add_profile_listener(listener):
     """
-    values = []
-    for named_value in named_values:
-        if not isinstance(named_value, (Sequence, dict)):
-            raise TypeError(
-                "@named_data expects a Sequence (list, tuple) or dictionary, and not '{}'.".format(type(named_value))
-            )
+    Call ``listener`` with an event for each step of decorating a class.
+
+    Events are dicts with an ``event`` key telling the step they time, the
+    ``module`` and ``class`` being decorated and the time taken in seconds:
+
+    - ``data_file`` events time loading a data file for a data driven
+      ``method``.  They give its ``path``, size in ``bytes``, number of
+      ``items``, whether the parsed data was ``cached`` on disk, and the
+      time taken to read it, parse it and generate the tests from it as
+      ``read_seconds``, ``parse_seconds`` and ``generate_seconds``.  As
+      JSON Lines files are streamed, the time taken to read and parse them
+      is part of ``generate_seconds``.
+    - ``method`` events time generating the ``tests`` of a data driven
+      ``method``, in ``seconds``.
+    - ``class`` events time the whole decoration of a class with ``ddt``,
+      in ``seconds``, with its number of data driven ``methods`` and
+      generated ``tests``.
+
+    Profiling can also be turned on by setting the ``DDT_PROFILE``
+    environment variable to the path of a file the events are appended to,
+    as JSON Lines.  ``{pid}`` in the path is replaced by the id of the
+    process.
+    """
+    _profile_listeners.append(listener)
 
-        value = _NamedDataDict(**named_value) if isinstance(named_value, dict) \
-            else _NamedDataList(named_value[0], *named_value[1:])
 
-        # Remove the __doc__ attribute so @ddt.data doesn't add the NamedData class docstrings to the test name.
-        value.__doc__ = None
+def remove_profile_listener(listener):
+    """
+    Stop calling a listener added with ``add_profile_listener``
+    """
+    _profile_listeners.remove(listener)
 
-        values.append(value)
 
-    def wrapper(func):
-        data(*values)(unpack(func))
-        return func
+def _profiling():
+    return bool(_profile_listeners or os.environ.get(PROFILE_ENV))
 
-    return wrapper
+
+def _profile_event(kind, cls, method=None, **fields):
+    event = {'event': kind, 'module': cls.__module__,
+             'class': cls.__qualname__}
+    if method is not None:
+        event['method'] = method
+    event.update(fields)
+    return event
+
+
+def _emit_profile_event(event):
+    for listener in list(_profile_listeners):
+        listener(event)
+    path = os.environ.get(PROFILE_ENV)
+    if path:
+        path = path.replace('{pid}', str(os.getpid()))
+        with open(path, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+
+
+def _emit_method_profile(cls, method, stats, tests, seconds):
+    if stats:
+        _emit_data_file_profile(cls, method, stats, tests, seconds)
+    _emit_profile_event(_profile_event('method', cls, method,
+                                       seconds=seconds, tests=tests))
+
+
+def _emit_data_file_profile(cls, method, stats, tests, seconds):
+    """
+    Emit the profile of a data file, which took ``seconds`` to load and
+    generate ``tests`` from
+    """
+    read, parse = stats['read_seconds'], stats['parse_seconds']
+    _emit_profile_event(_profile_event(
+        'data_file', cls, method,
+        path=stats['data_file'],
+        bytes=stats['bytes'],
+        items=stats['items'],
+        tests=tests,
+        cached=stats['cached'],
+        read_seconds=read,
+        parse_seconds=parse,
+        generate_seconds=seconds - (read or 0) - (parse or 0),
+    ))
+
+
+class _JSONLinesTest(_GeneratedTest):
+    """
+    A test whose data item is read back from a JSON Lines file when built.
+
+    Only the offset of the record in the file is kept, so that lazily
+    generated tests do not hold on to the decoded data.  As compressed files
+    cannot be read from an offset without decompressing everything before
+    it, the raw ``record`` is kept instead for these.
+    """
+    __slots__ = ('path', 'offset', 'record')
+
+    def __init__(self, func, method, index, name, doc, path, offset,
+                 record=None):
+        super(_JSONLinesTest, self).__init__(func, method, index, name, doc)
+        self.path = path
+        self.offset = offset
+        self.record = record
+
+    def _arguments(self):
+        record = self.record
+        if record is None:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                record = f.readline()
+        return _file_data_arguments(_json_loads(record))
+
+
+class _CaseStoreTest(_GeneratedTest):
+    """
+    A test whose data item is read from a case store when it runs.
+
+    The index of the item in the store is kept apart from ``index``, which
+    counts the items of all the files of a glob.
+    """
+    __slots__ = ('store', 'store_index')
+
+    def __init__(self, func, method, index, name, doc, store):
+        super(_CaseStoreTest, self).__init__(func, method, index, name, doc)
+        self.store = store
+        self.store_index = index
+
+    def _build(self):
+        func, store, index = self.func, self.store, self.store_index
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def run(instance):
+                args, kwargs = store.arguments(index)
+                return await func(instance, *args, **kwargs)
+        else:
+            @wraps(func)
+            def run(instance):
+                args, kwargs = store.arguments(index)
+                return func(instance, *args, **kwargs)
+
+        return feed_data(run, self.name, self.doc)
+
+    def _arguments(self):
+        return self.store.arguments(self.store_index)
+
+
+class _BatchTest(_GeneratedTest):
+    """
+    A test that runs with the data items of several tests at once.
+
+    The arguments of the tests are passed as columns: the n-th positional
+    argument is the list of the n-th positional arguments of all the tests,
+    and each keyword argument the list of its values in all the tests.
+    """
+    __slots__ = ('tests', )
+
+    def __init__(self, func, method, index, name, doc, tests):
+        super(_BatchTest, self).__init__(func, method, index, name, doc)
+        self.tests = tests
+
+    def _build(self):
+        func, names = self.func, [test.name for test in self.tests]
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def run(instance, *args, **kwargs):
+                setattr(instance, BATCH_NAMES_ATTR, names)
+                return await func(instance, *args, **kwargs)
+        else:
+            @wraps(func)
+            def run(instance, *args, **kwargs):
+                setattr(instance, BATCH_NAMES_ATTR, names)
+                return func(instance, *args, **kwargs)
+
+        args, kwargs = self._arguments()
+        return feed_data(run, self.name, self.doc, *args, **kwargs)
+
+    def _arguments(self):
+        arguments = [test._arguments() for test in self.tests]
+        args = [list(column) for column in zip(*(a for a, _ in arguments))]
+        keys = arguments[0][1].keys() if arguments else ()
+        kwargs = dict(
+            (key, [kw[key] for _, kw in arguments]) for key in keys
+        )
+        return args, kwargs
+
+
+class _ConcurrentTest(_GeneratedTest):
+    """
+    A test that reports the outcome of a test case run by its
+    ``_ConcurrentCases``.
+
+    It always stays on the class, even once built, so that looking it up
+    from a test case instance loads the test case into its
+    ``_ConcurrentCases``: only the test cases the test loader created an
+    instance for are run.
+    """
+    __slots__ = ('test', 'cases', 'built')
+
+    def __init__(self, test, cases):
+        super(_ConcurrentTest, self).__init__(
+            test.func, test.method, test.index, test.name, test.doc
+        )
+        self.test = test
+        self.cases = cases
+        self.built = None
+
+    def _materialize(self, owner):
+        self.cases.load(self.name)
+        if self.built is None:
+            self.built = self.build()
+        return self.built
+
+    def _build(self):
+        cases, name = self.cases, self.name
+
+        if inspect.iscoroutinefunction(self.func):
+            @wraps(self.func)
+            async def report(instance, *args, **kwargs):
+                return await cases.run(instance, name)
+        else:
+            @wraps(self.func)
+            def report(instance, *args, **kwargs):
+                return cases.run_in_threads(instance, name)
+
+        args, kwargs = self._arguments()
+        return feed_data(report, self.name, self.doc, *args, **kwargs)
+
+    def _arguments(self):
+        return self.test._arguments()
+
+
+class _ConcurrentCases(object):
+    """
+    The test cases generated for a method that run concurrently.
+
+    Only the test cases that have been loaded, i.e. looked up from a test
+    case instance, are run, so that the ones left out by the test loader
+    are not.
+    """
+
+    def __init__(self, tests, limit=None):
+        self.tests = tests
+        self.limit = limit
+        self.loaded = set()
+        self.outcomes = {}
+
+    def load(self, name):
+        """
+        Include a test case in the next run.
+        """
+        self.loaded.add(name)
+
+    def reset(self):
+        """
+        Forget the loaded test cases and the outcomes not reported yet.
+        """
+        self.loaded.clear()
+        self.outcomes.clear()
+
+    async def run(self, instance, name):
+        """
+        Return the result of a test case, running all the test cases that
+        have not been run yet on the event loop first if needed.
+        """
+        if name not in self.outcomes:
+            await self._gather(instance)
+        return self._outcome(name)
+
+    def run_in_threads(self, instance, name):
+        """
+        Return the result of a test case, running all the test cases that
+        have not been run yet in a pool of threads first if needed.
+        """
+        if name not in self.outcomes:
+            pending = self._pending()
+            with ThreadPoolExecutor(self.limit) as executor:
+                outcomes = executor.map(
+                    lambda test: self._call(instance, test), pending
+                )
+                for test, outcome in zip(pending, outcomes):
+                    self.outcomes[test.name] = outcome
+        return self._outcome(name)
+
+    def _pending(self):
+        return [
+            test for test in self.tests
+            if test.name in self.loaded and test.name not in self.outcomes
+        ]
+
+    def _outcome(self, name):
+        result, error = self.outcomes.pop(name)
+        if error is not None:
+            raise error
+        return result
+
+    @staticmethod
+    def _call(instance, test):
+        args, kwargs = test._arguments()
+        try:
+            return test.func(instance, *args, **kwargs), None
+        except Exception as e:
+            return None, e
+
+    async def _gather(self, instance):
+        # Only imported when needed, as it is slow to import
+        import asyncio
+
+        semaphore = asyncio.Semaphore(self.limit) if self.limit else None
+
+        async def run(test):
+            args, kwargs = test._arguments()
+            try:
+                if semaphore is None:
+                    result = await test.func(instance, *args, **kwargs)
+                else:
+                    async with semaphore:
+                        result = await test.func(instance, *args, **kwargs)
+            except Exception as e:
+                self.outcomes[test.name] = (None, e)
+            else:
+                self.outcomes[test.name] = (result, None)
+
+        await asyncio.gather(*[run(test) for test in self._pending()])
+
+
+def _concurrent_tests(tests, limit=None):
+    """
+    Make the tests generated for a method run concurrently
+    """
+    tests = list(tests)
+    cases = _ConcurrentCases(tests, limit)
+    return [_ConcurrentTest(test, cases) for test in tests]
+
+
+def _reset_after_class(cls, cases):
+    """
+    Reset the ``_ConcurrentCases`` of a class when it is torn down, so that
+    the outcomes of test cases that were run but not reported are not
+    reported by a later run.
+    """
+    tear_down = cls.__dict__.get('tearDownClass')
+
+    def tearDownClass(klass):
+        try:
+            if tear_down is not None:
+                tear_down.__get__(None, klass)()
+            else:
+                inherited = getattr(super(cls, klass), 'tearDownClass', None)
+                if inherited is not None:
+                    inherited()
+        finally:
+            for item in cases:
+                item.reset()
+
+    cls.tearDownClass = classmethod(tearDownClass)
+
+
+def process_file_data(cls, name, func, file_attr):
+    """
+    Process the parameter in the `file_data` decorator.
+    """
+    stats = {} if _profiling() else None
+    start = time.perf_counter()
+    count = 0
+    for test in _file_data_tests(cls, name, func, file_attr, stats=stats):
+        setattr(cls, test.name, test.build())
+        count += 1
+    if stats:
+        _emit_data_file_profile(cls, name, stats, count,
+                                time.perf_counter() - start)
+
+
+def _file_data_tests(cls, name, func, file_attr, lazy=False, select=None,
+                     stats=None):
+    """
+    Generate the tests for the file named in the `file_data` decorator.
+
+    JSON Lines files are streamed record by record.  If ``lazy`` is set, the
+    generated tests only keep the position of their record in the file.
+    ``select`` is an optional predicate on test names, which lets records
+    of tests that will not be selected be skipped without decoding them.
+    If ``stats`` is a dict, the path, size and number of items of the file
+    and the time taken to read and parse it are recorded in it.
+    """
+    directory = _source_dir(cls)
+    data_file_path = os.path.join(directory, file_attr)
+
+    if _glob_magic.search(file_attr) or os.path.isdir(data_file_path):
+        return _data_files_tests(name, func, directory, file_attr, lazy,
+                                 select, stats)
+    return _data_file_tests(name, func, data_file_path, file_attr, lazy,
+                            select, stats)
+
+
+def _data_file_tests(name, func, data_file_path, file_attr, lazy=False,
+                     select=None, stats=None):
+    """
+    Generate the tests for a single data file, named ``file_attr`` in error
+    messages
+    """
+    def create_error_func(message):  # pylint: disable-msg=W0613
+        def func(*args):
+            raise ValueError(message % file_attr)
+        return func
+
+    # If the file cannot be loaded, provide an error function instead
+    error = _data_file_error(data_file_path)
+    if error:
+        test_name = mk_test_name(name, "error")
+        test_docstring = """Error!"""
+        return [_GeneratedTest(create_error_func(error),
+                               name, 0, test_name, test_docstring, (None,))]
+
+    if stats is not None:
+        stats['data_file'] = data_file_path
+
+    if _data_file_extension(data_file_path) in JSON_LINES_EXTENSIONS:
+        return _json_lines_tests(name, func, data_file_path, lazy, select,
+                                 stats)
+    if _data_file_extension(data_file_path) in CSV_DIALECTS:
+        return _csv_tests(name, func, data_file_path, select, stats)
+    if _data_file_extension(data_file_path) == CASE_STORE_EXTENSION:
+        return _case_store_tests(name, func, data_file_path, select, stats)
+
+    data = _load_interned_file_data(
+        data_file_path, _get_decoder(data_file_path),
+        getattr(func, YAML_LOADER_ATTR, None), stats
+    )
+    if stats is not None:
+        stats['items'] = len(data)
+    return _tests_from_data(name, func, data)
+
+
+def _data_file_error(path):
+    """
+    Return the error message template for a data file that cannot be
+    loaded, if any
+    """
+    if not os.path.exists(path):
+        return "%s does not exist"
+    # Don't have YAML but want to use YAML file.
+    if _data_file_extension(path) in (".yml", ".yaml") and not _have_yaml:
+        return "%s is a YAML file, please install PyYAML"
+    return None
+
+
+def _data_file_paths(directory, file_attr):
+    """
+    Return the root directory and the sorted paths of the data files
+    matching a glob pattern or under a directory, relative to ``directory``
+    """
+    pattern = os.path.join(directory, file_attr)
+    if os.path.isdir(pattern):
+        paths = [
+            os.path.join(subdirectory, filename)
+            for subdirectory, _, filenames in os.walk(pattern)
+            for filename in filenames
+            if _data_file_extension(filename) in _data_file_extensions()
+        ]
+        return pattern, sorted(paths)
+    root = os.path.join(directory,
+                        file_attr[:_glob_magic.search(file_attr).start()])
+    root = root if root.endswith(os.sep) else os.path.dirname(root)
+    # Only ``file_attr`` is a pattern, whatever the name of the directory
+    pattern = os.path.join(glob.escape(directory), file_attr)
+    paths = [path for path in glob.glob(pattern, recursive=True)
+             if os.path.isfile(path)]
+    return root, sorted(paths)
+
+
+def _data_file_extensions():
+    return set(_decoders).union(JSON_LINES_EXTENSIONS, CSV_DIALECTS,
+                                (CASE_STORE_EXTENSION, ))
+
+
+def _is_loaded_whole(path):
+    """
+    Tell whether a data file is loaded as a whole rather than streamed
+    """
+    extension = _data_file_extension(path)
+    return not _data_file_error(path) and \
+        extension not in JSON_LINES_EXTENSIONS and \
+        extension not in CSV_DIALECTS and extension != CASE_STORE_EXTENSION
+
+
+def _data_files_tests(name, func, directory, file_attr, lazy=False,
+                      select=None, stats=None):
+    """
+    Generate the tests for the data files matching a glob pattern or under a
+    directory, loading the files that are not streamed concurrently
+
+    The tests of each file are named as if the data driven method was named
+    after the file too, and indexed across all files.  As different paths
+    can give the same test names, e.g. ``a_b.json`` and ``a/b.json``, tests
+    whose name is taken already are replaced by a single error test.
+    """
+    root, paths = _data_file_paths(directory, file_attr)
+    if not paths:
+        yield _error_test(name, "{0} matches no data file".format(file_attr))
+        return
+
+    start = time.perf_counter()
+    whole = [path for path in paths if _is_loaded_whole(path)]
+    loader = getattr(func, YAML_LOADER_ATTR, None)
+    if hasattr(func, PROCESSES_ATTR):
+        # Only imported when needed, as it imports ``multiprocessing``
+        from concurrent.futures import ProcessPoolExecutor as executor
+    else:
+        executor = ThreadPoolExecutor
+    keys = [_intern_key(path, _get_decoder(path), loader) for path in whole]
+    loaded = dict((path, _interned(*key)) for path, key in zip(whole, keys))
+    missing = [path for path in whole if loaded[path] is None]
+    with executor() as pool:
+        loaded.update(zip(missing, pool.map(
+            _load_file_data, missing, map(_get_decoder, missing),
+            [loader] * len(missing)
+        )))
+    for path, key in zip(whole, keys):
+        _intern(key[0], key[1], loaded[path])
+    load_seconds = time.perf_counter() - start
+
+    offset = 0
+    names, clashes = {}, []
+    for path in paths:
+        relative = os.path.relpath(path, root)
+        prefix = relative[:len(relative) - len(_data_file_suffix(relative))]
+        file_name = _invalid_identifier_chars.sub(
+            '_', '{0}_{1}'.format(name, prefix)
+        )
+        file_stats = {}
+        if path in loaded:
+            file_stats['items'] = len(loaded[path])
+            tests = _tests_from_data(file_name, func, loaded[path])
+        else:
+            tests = _data_file_tests(file_name, func, path, relative, lazy,
+                                     select, file_stats)
+        for test in tests:
+            if test.name in names:
+                clashes.append("{0} ({1} and {2})".format(
+                    test.name, names[test.name], relative
+                ))
+                continue
+            names[test.name] = relative
+            # Keep naming the data driven method the tests come from
+            test.method = name
+            test.index += offset
+            yield test
+        offset += file_stats.get('items', 0)
+
+    if clashes:
+        yield _error_test(name, "{0} gives the same test names for "
+                          "different items: {1}".format(file_attr,
+                                                        ", ".join(clashes)))
+
+    if stats is not None:
+        stats.update(
+            data_file=os.path.join(directory, file_attr), items=offset,
+            cached=False, read_seconds=None, parse_seconds=load_seconds,
+            bytes=sum(os.path.getsize(path) for path in paths),
+        )
+
+
+def _error_test(name, message):
+    """
+    Return a test raising a ``ValueError`` with ``message`` when it runs
+    """
+    def error(*args):
+        raise ValueError(message)
+    return _GeneratedTest(error, name, 0, mk_test_name(name, "error"),
+                          "Error!", (None,))
+
+
+def _data_file_suffix(path):
+    """
+    Return the extensions of a data file, compression included
+    """
+    root, extension = os.path.splitext(path)
+    if extension in COMPRESSION_EXTENSIONS:
+        extension = os.path.splitext(root)[1] + extension
+    return extension
+
+
+def _source_dir(cls):
+    """
+    Return the directory of the source file of a class, which the paths of
+    its data files are relative to
+    """
+    directory = _source_dirs.get(cls.__module__)
+    if directory is None:
+        directory = os.path.dirname(os.path.abspath(
+            inspect.getsourcefile(cls)
+        ))
+        _source_dirs[cls.__module__] = directory
+    return directory
+
+
+def invalidate_file_data(path=None):
+    """
+    Forget the parsed data of the data file ``path``, or of all data files.
+
+    If the ``DDT_INTERN_SIZE`` environment variable is set to a positive
+    number, the data parsed from a data file is kept in memory and shared
+    by all the methods and classes using the file with the same decoder and
+    YAML loader, so that it is only read and parsed once.  Data files are
+    parsed again when they change, and only the data of the last
+    ``DDT_INTERN_SIZE`` data files used is kept.  This function releases the
+    memory of data files that will not be used again.
+
+    Sharing is off by default, since the data items fed to the tests are
+    then the same objects for all of them: it is only safe for test suites
+    whose tests do not modify their data items.
+    """
+    path = path and os.path.realpath(path)
+    with _intern_lock:
+        for key in list(_interned_data):
+            if path is None or key[0] == path:
+                del _interned_data[key]
+
+
+def _intern_key(path, decoder, loader=None):
+    """
+    Return the key of the interned data of a data file and its version
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    return (path, decoder, loader), (stat.st_mtime_ns, stat.st_size)
+
+
+def _interned(key, version):
+    """
+    Return the interned data for a key if it is up to date, or ``None``
+    """
+    if _intern_size() <= 0:
+        return None
+    with _intern_lock:
+        entry = _interned_data.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        _interned_data.move_to_end(key)
+        return entry[1]
+
+
+def _intern(key, version, data):
+    """
+    Intern the data for a key, dropping the least recently used data above
+    the limit, and return it
+    """
+    size = _intern_size()
+    if size <= 0:
+        return data
+    with _intern_lock:
+        _interned_data[key] = (version, data)
+        _interned_data.move_to_end(key)
+        while len(_interned_data) > size:
+            _interned_data.popitem(last=False)
+    return data
+
+
+def _intern_size():
+    return int(os.environ.get(INTERN_SIZE_ENV, INTERN_DEFAULT_SIZE))
+
+
+def _load_interned_file_data(path, decoder, loader=None, stats=None):
+    """
+    Load a data file, unless its data has been interned already
+    """
+    key, version = _intern_key(path, decoder, loader)
+    data = _interned(key, version)
+    if data is None:
+        return _intern(key, version,
+                       _load_file_data(path, decoder, loader, stats))
+    if stats is not None:
+        stats.update(bytes=version[1], cached=True, read_seconds=0.0,
+                     parse_seconds=0.0)
+    return data
+
+
+def _parse_file_data(content, decoder, loader=None):
+    """
+    Parse the content of a data file with the given decoder
+
+    Compressed content is decompressed as the decoder reads it.
+    """
+    stream = _decompressed(io.BufferedReader(io.BytesIO(content)))
+    if loader:
+        return decoder(stream, loader)
+    return decoder(stream)
+
+
+def _json_loads(s):
+    """
+    Decode JSON with the fastest decoder installed.
+
+    The standard library decoder is used as a fallback for documents that
+    the fast decoders reject but ``json`` accepts, e.g. NaN or big integers.
+    """
+    if _fast_json_loads is not None:
+        try:
+            return _fast_json_loads(s)
+        except ValueError:
+            pass
+    return json.loads(s)
+
+
+def _decode_json(stream, loader=None):
+    return _json_loads(stream.read())
+
+
+def _decode_yaml(stream, loader=None):
+    return yaml.load(stream, Loader=_fast_yaml_loader(loader or yaml.SafeLoader))
+
+
+# Decoders for ``file_data`` files by extension, see ``register_decoder``.
+_decoders = {
+    '.json': _decode_json,
+    '.yml': _decode_yaml,
+    '.yaml': _decode_yaml,
+}
+
+
+def _fast_yaml_loader(loader):
+    """
+    Return the libyaml based equivalent of a PyYAML loader, if available.
+
+    Only PyYAML's own loaders are swapped, since a custom loader class may
+    have been set up with its own constructors or resolvers.
+    """
+    if not getattr(yaml, '__with_libyaml__', False):
+        return loader
+    if loader.__module__ != yaml.loader.__name__:
+        return loader
+    return getattr(yaml, 'C' + loader.__name__, loader)
+
+
+def _load_file_data(path, decoder, loader=None, stats=None):
+    """
+    Load a data file, going through the on-disk cache of parsed data files
+    if the ``DDT_CACHE_DIR`` environment variable is set.
+
+    The file is read in one go, so that reading it can be timed apart from
+    parsing it.  If ``stats`` is a dict, both timings are recorded in it.
+    """
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        content = f.read()
+    read = time.perf_counter()
+    cached = False
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        data = _parse_file_data(content, decoder, loader)
+    else:
+        digest = hashlib.sha1(content)
+        # Decoders registered as lambdas share their qualified name, but not
+        # the extension they decode
+        digest.update(repr((_data_file_extension(path),
+                            _qualified_name(decoder), _qualified_name(loader),
+                            __version__)).encode('utf-8'))
+        cache_path = os.path.join(cache_dir, digest.hexdigest() + '.pickle')
+        try:
+            with open(cache_path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception:  # missing, stale or unreadable cache entry
+            data = _parse_file_data(content, decoder, loader)
+            _write_cache_entry(cache_dir, cache_path, data)
+        else:
+            # Record the hit so that eviction drops the least recently used
+            # entries first.
+            os.utime(cache_path, None)
+            cached = True
+    if stats is not None:
+        stats.update(bytes=len(content), cached=cached,
+                     read_seconds=read - start,
+                     parse_seconds=time.perf_counter() - read)
+    return data
+
+
+def _qualified_name(obj):
+    if obj is None:
+        return None
+    # Callables like ``functools.partial`` objects have no qualified name
+    return '{0}.{1}'.format(getattr(obj, '__module__', None),
+                            getattr(obj, '__qualname__', repr(obj)))
+
+
+def _write_cache_entry(cache_dir, cache_path, data):
+    """
+    Store parsed data in the cache, then evict old entries above the limit
+
+    Caching is best effort: data that cannot be pickled (e.g. objects built
+    by a custom YAML loader) or written is silently left out of the cache.
+    """
+    try:
+        payload = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a private file first so that concurrent test processes
+        # never see a partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, cache_path)
+    except OSError:  # e.g. a read-only cache directory
+        return
+    max_size = int(os.environ.get(CACHE_SIZE_ENV, CACHE_DEFAULT_SIZE))
+    _evict_cache_entries(cache_dir, max_size)
+
+
+def _evict_cache_entries(cache_dir, max_size):
+    """
+    Remove the least recently used cache entries until the cache fits in
+    ``max_size`` bytes
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.pickle'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:  # already evicted by another process
+            pass
+        total -= size
+
+
+def _add_tests_from_data(cls, name, func, data):
+    """
+    Add tests from data loaded from the data file into the class
+    """
+    for test in _tests_from_data(name, func, data):
+        setattr(cls, test.name, test.build())
+
+
+def _tests_from_data(name, func, data):
+    """
+    Generate tests from data loaded from the data file
+    """
+    namer = _TestNamer(name, len(str(len(data))))
+    for i, elem in enumerate(data):
+        if isinstance(data, dict):
+            key, value = elem, data[elem]
+            test_name = namer(key, i)
+        elif isinstance(data, list):
+            value = elem
+            test_name = namer(value, i)
+        args, kwargs = _file_data_arguments(value)
+        yield _GeneratedTest(func, name, i, test_name, test_name, args, kwargs)
+
+
+def _file_data_arguments(value):
+    """
+    Return the positional and keyword arguments a data file item is fed as
+    """
+    if isinstance(value, dict):
+        return (), value
+    return (value,), {}
+
+
+def _json_lines_records(path):
+    """
+    Yield the offset and raw content of each record of a JSON Lines file
+    """
+    with _open_data_file(path) as f:
+        offset = 0
+        for line in f:
+            if line.strip():
+                yield offset, line
+            offset += len(line)
+
+
+def _json_lines_tests(name, func, path, lazy=False, select=None, stats=None):
+    """
+    Generate tests from a JSON Lines file, one record at a time
+
+    The file is read twice: once to count the records, which is needed to
+    zero-pad the test names, and once to decode them.  Neither pass keeps
+    more than one record in memory.
+
+    Records that are JSON objects are not decoded unless needed: they are
+    named after their index only, so ``select`` can skip them beforehand,
+    and lazily generated tests decode them when they are built.
+
+    As reading and decoding the records is interleaved with generating the
+    tests, only the size and number of records are recorded in ``stats``.
+    """
+    count = sum(1 for _ in _json_lines_records(path))
+    if stats is not None:
+        stats.update(bytes=os.path.getsize(path), items=count, cached=False,
+                     read_seconds=None, parse_seconds=None)
+    index_len = len(str(count))
+    namer = _TestNamer(name, index_len)
+    compressed = lazy and _is_compressed(path)
+    for i, (offset, line) in enumerate(_json_lines_records(path)):
+        value = None
+        if line.lstrip().startswith(b'{'):
+            test_name = namer.index_name(i)
+        else:
+            value = _json_loads(line)
+            test_name = namer(value, i)
+        if select and not select(test_name):
+            continue
+        if lazy:
+            yield _JSONLinesTest(func, name, i, test_name, test_name, path,
+                                 offset, line if compressed else None)
+            continue
+        if value is None:
+            value = _json_loads(line)
+        args, kwargs = _file_data_arguments(value)
+        yield _GeneratedTest(func, name, i, test_name, test_name, args, kwargs)
+
+
+@contextmanager
+def _csv_rows(path):
+    """
+    Yield an iterator of the line numbers and rows of a CSV or TSV file
+
+    Like ``csv.DictReader``, empty rows are skipped.
+    """
+    dialect = CSV_DIALECTS[_data_file_extension(path)]
+    with _open_data_file(path) as f:
+        # Spreadsheets often start CSV files with a byte order mark
+        text = io.TextIOWrapper(f, encoding='utf-8-sig', newline='')
+        reader = csv.reader(text, dialect)
+        yield ((reader.line_num, row) for row in reader if row)
+
+
+def _csv_tests(name, func, path, select=None, stats=None):
+    """
+    Generate tests from a CSV or TSV file, one row at a time
+
+    Like JSON Lines files, the file is read twice, once to count the rows.
+    The converters of the columns are looked up once from the header, and
+    only applied to the rows of the selected tests.  Empty rows are skipped,
+    and rows with more or fewer fields than the header raise a
+    ``ValueError``.
+    """
+    with _csv_rows(path) as rows:
+        count = max(sum(1 for _ in rows) - 1, 0)
+    if stats is not None:
+        stats.update(bytes=os.path.getsize(path), items=count, cached=False,
+                     read_seconds=None, parse_seconds=None)
+    namer = _TestNamer(name, len(str(count)))
+    columns = getattr(func, COLUMNS_ATTR, {})
+    key_column = getattr(func, KEY_COLUMN_ATTR, None)
+    with _csv_rows(path) as rows:
+        header = next(rows, (0, []))[1]
+        converters = [columns.get(field) for field in header]
+        key = _key_index(path, header, key_column)
+        for i, (line, row) in enumerate(rows):
+            if len(row) != len(header):
+                raise ValueError(
+                    "{0}, line {1}: {2} fields, the header has {3}".format(
+                        path, line, len(row), len(header)
+                    )
+                )
+            if key is None:
+                test_name = namer.index_name(i)
+            else:
+                test_name = namer(row[key], i)
+            if select and not select(test_name):
+                continue
+            kwargs = {
+                field: convert(cell) if convert else cell
+                for field, convert, cell in zip(header, converters, row)
+            }
+            yield _GeneratedTest(func, name, i, test_name, test_name, (),
+                                 kwargs)
+
+
+def make_case_store(source, destination, yaml_loader=None):
+    """
+    Convert a data file loaded by ``file_data`` into a case store.
+
+    A case store is a binary file with the ``.ddtcases`` extension, which
+    ``file_data`` loads in time proportional to the number of its items,
+    rather than to its size: it starts with an index of the names and
+    offsets of the items, followed by the values of the items, pickled one
+    by one.  The store is memory mapped, and the value of an item is only
+    unpickled when its test runs, so only the items of the tests that run
+    are ever read.  As with any pickle, only load case stores you trust.
+
+    ``source`` is a file in any format ``file_data`` decodes as a whole,
+    e.g. JSON or YAML, loaded with ``yaml_loader`` if given.  The tests
+    generated from ``destination`` are the same as from ``source``.
+    """
+    data = _load_file_data(source, _get_decoder(source), yaml_loader)
+    if isinstance(data, dict):
+        items = data.items()
+    else:
+        items = ((value, value) for value in data)
+    names, offsets = [], array('Q', [0])
+    directory = os.path.dirname(os.path.abspath(destination))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f, tempfile.TemporaryFile() as records:
+            for key, value in items:
+                # Items that do not name their test are named by index
+                names.append((key, ) if is_trivial(key) else ())
+                offsets.append(offsets[-1] + records.write(
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                ))
+            index = pickle.dumps((names, offsets), pickle.HIGHEST_PROTOCOL)
+            f.write(_case_store_header.pack(
+                _case_store_magic, _case_store_version, len(index)
+            ))
+            f.write(index)
+            records.seek(0)
+            shutil.copyfileobj(records, f)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class _CaseStore(object):
+    """
+    A case store written by ``make_case_store``, memory mapped
+    """
+
+    def __init__(self, path):
+        import mmap
+
+        with open(path, 'rb') as f:
+            try:
+                magic, version, index_length = _case_store_header.unpack(
+                    f.read(_case_store_header.size)
+                )
+            except struct.error:  # shorter than the header
+                magic = None
+            if magic != _case_store_magic:
+                raise ValueError("{0} is not a case store".format(path))
+            if version != _case_store_version:
+                raise ValueError(
+                    "{0} is a case store of unsupported version {1}".format(
+                        path, version
+                    ))
+            self.names, self.offsets = pickle.loads(f.read(index_length))
+            self.start = f.tell()
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def arguments(self, index):
+        """
+        Return the arguments of the item at ``index``, as ``file_data``
+        feeds them
+        """
+        start = self.start + self.offsets[index]
+        end = self.start + self.offsets[index + 1]
+        return _file_data_arguments(pickle.loads(self.data[start:end]))
+
+
+def _case_store_tests(name, func, path, select=None, stats=None):
+    """
+    Generate the tests for the items of a case store, from its index only
+    """
+    start = time.perf_counter()
+    key, version = _intern_key(path, _CaseStore)
+    store = _interned(key, version) or _intern(key, version, _CaseStore(path))
+    if stats is not None:
+        stats.update(bytes=os.path.getsize(path), items=len(store.names),
+                     cached=False, read_seconds=None,
+                     parse_seconds=time.perf_counter() - start)
+    namer = _TestNamer(name, len(str(len(store.names))))
+    for i, key in enumerate(store.names):
+        test_name = namer(key[0], i) if key else namer.index_name(i)
+        if select and not select(test_name):
+            continue
+        yield _CaseStoreTest(func, name, i, test_name, test_name, store)
+
+
+def _key_index(path, columns, key_column=None):
+    """
+    Return the index of the column naming the rows of a table, if any
+    """
+    if not key_column:
+        return None
+    if key_column not in columns:
+        raise ValueError("{0} has no column {1!r}".format(path, key_column))
+    return columns.index(key_column)
+
+
+def _data_tests(name, func, name_fmt):
+    """
+    Generate the tests for the values in the `data` decorator.
+    """
+    namer = _TestNamer(name, getattr(func, INDEX_LEN), name_fmt)
+    unpack_value = hasattr(func, UNPACK_ATTR)
+    for i, v in enumerate(getattr(func, DATA_ATTR)):
+        test_name = namer(getattr(v, "__name__", v), i)
+        test_data_docstring = _get_test_data_docstring(func, v)
+        if not unpack_value:
+            args, kwargs = (v,), None
+        elif isinstance(v, tuple) or isinstance(v, list):
+            args, kwargs = v, None
+        else:
+            # unpack dictionary
+            args, kwargs = (), v
+        yield _GeneratedTest(func, name, i, test_name, test_data_docstring,
+                             args, kwargs)
+
+
+def _method_tests(cls, name, func, name_fmt, lazy=False, select=None,
+                  stats=None):
+    """
+    Generate the selected tests for a data driven method
+    """
+    if hasattr(func, SQLITE_ATTR):
+        # Selects the tests itself, as it may leave sharding to the query
+        tests = _sqlite_tests(cls, name, func, select, stats)
+    elif hasattr(func, DATA_ATTR):
+        tests = _data_tests(name, func, name_fmt)
+    else:
+        file_attr = getattr(func, FILE_ATTR)
+        tests = _file_data_tests(cls, name, func, file_attr, lazy, select,
+                                 stats)
+    if select and not hasattr(func, SQLITE_ATTR):
+        tests = (t for t in tests if select(t.name))
+    if hasattr(func, BATCH_ATTR):
+        tests = _batch_tests(name, func, tests, getattr(func, BATCH_ATTR))
+    return tests
+
+
+def _sqlite_tests(cls, name, func, select=None, stats=None):
+    """
+    Generate the tests for the rows returned by the query of the
+    `sqlite_data` decorator, fetching them from the cursor in batches
+    """
+    path, query, params, batch_size = getattr(func, SQLITE_ATTR)
+    db_path = os.path.join(_source_dir(cls), path)
+    if not os.path.exists(db_path):
+        # Connecting would create an empty database
+        def error(*args):
+            raise ValueError("{0} does not exist".format(path))
+        return [_GeneratedTest(error, name, 0, mk_test_name(name, "error"),
+                               "Error!", (None,))]
+
+    pushdown = _shard_params.search(query) is not None
+    if pushdown:
+        index, count = getattr(select, 'shard', None) or (0, 1)
+        params = dict(params or {}, shard_index=index, shard_count=count)
+    return _sqlite_rows_tests(name, func, db_path, query, params or (),
+                              batch_size, select, not pushdown, stats)
+
+
+def _sqlite_rows_tests(name, func, db_path, query, params, batch_size,
+                       select, sharded, stats):
+    import sqlite3
+
+    connection = sqlite3.connect(db_path)
+    try:
+        # A line break ends a comment closing the query
+        count, = connection.execute(
+            'SELECT COUNT(*) FROM ({0}\n)'.format(query), params
+        ).fetchone()
+        if stats is not None:
+            stats.update(data_file=db_path, bytes=os.path.getsize(db_path),
+                         items=count, cached=False, read_seconds=None,
+                         parse_seconds=None)
+        namer = _TestNamer(name, len(str(count)))
+        key_column = getattr(func, KEY_COLUMN_ATTR, None)
+        cursor = connection.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        key = _key_index(db_path, columns, key_column)
+        index = 0
+        for rows in iter(partial(cursor.fetchmany, batch_size), []):
+            for row in rows:
+                if key is None:
+                    test_name = namer.index_name(index)
+                else:
+                    test_name = namer(row[key], index)
+                if not select or select(test_name, sharded):
+                    yield _GeneratedTest(func, name, index, test_name,
+                                         test_name, (),
+                                         dict(zip(columns, row)))
+                index += 1
+    finally:
+        connection.close()
+
+
+def _batch_tests(name, func, tests, size=None):
+    """
+    Group the tests generated for a method decorated with ``@batch``
+    """
+    tests = list(tests)
+    size = size or len(tests) or 1
+    chunks = [tests[start:start + size]
+              for start in range(0, len(tests), size)]
+    namer = _TestNamer(name, len(str(len(chunks))))
+    for i, chunk in enumerate(chunks):
+        yield _BatchTest(func, name, i, namer.index_name(i), func.__doc__,
+                         chunk)
+
+
+def _collapsed_test(func, tests):
+    """
+    Return a test method running the generated tests as subtests.
+
+    ``tests`` is called each time the test method is run to generate the
+    tests, so that nothing is generated for the data items beforehand.
+    """
+    values = getattr(func, DATA_ATTR, ())
+    if iter(values) is values:
+        # Keep values from a one-time-use iterator for every run
+        setattr(func, DATA_ATTR, tuple(values))
+
+    if inspect.iscoroutinefunction(func):
+        async def wrapper(self):
+            for test in tests():
+                args, kwargs = test._arguments()
+                with self.subTest(test.name):
+                    await test.func(self, *args, **kwargs)
+    else:
+        def wrapper(self):
+            for test in tests():
+                args, kwargs = test._arguments()
+                with self.subTest(test.name):
+                    test.func(self, *args, **kwargs)
+
+    # Unlike ``wraps``, leave out the data attributes of ``func``
+    return update_wrapper(wrapper, func, updated=())
+
+
+def _parse_shard(shard):
+    """
+    Return the index and count of a shard given as a tuple or as a string
+    formatted as ``index/count``
+    """
+    try:
+        if isinstance(shard, str):
+            shard = [int(part) for part in shard.split('/')]
+        index, count = shard
+    except (TypeError, ValueError):
+        raise ValueError(
+            "Invalid shard {0!r}, expected (index, count)".format(shard)
+        )
+    if not 0 <= index < count:
+        raise ValueError(
+            "Shard index {0} is not in range 0..{1}".format(index, count - 1)
+        )
+    return index, count
+
+
+def _in_shard(test_name, shard):
+    """
+    Tell whether a generated test belongs to a shard.
+
+    The hash must be the same in every process, which rules out ``hash``.
+    """
+    index, count = shard
+    return zlib.crc32(test_name.encode('utf-8')) % count == index
+
+
+def _read_history(path, read):
+    """
+    Read a file recorded by a previous test run with ``read(f)``, caching
+    the result until the file changes
+
+    A missing file gives ``None``, so that the first run of a test suite can
+    record the history used by the following ones.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _history_cache.get((path, read))
+    if cached and cached[0] == version:
+        return cached[1]
+    with open(path, newline='') as f:
+        history = read(f)
+    _history_cache[(path, read)] = (version, history)
+    return history
+
+
+def _load_durations(path):
+    """
+    Return the mean duration of each test in a timings file written by
+    ``record_timings``, by full test name (``module.Class.test_name``)
+    """
+    read = _read_csv_durations if path.endswith('.csv') else _read_durations
+    return _read_history(path, read) or {}
+
+
+def _read_csv_durations(f):
+    return _read_durations(f, csv.DictReader(f))
+
+
+def _read_durations(f, records=None):
+    totals = {}
+    for record in records if records is not None else json.load(f):
+        if record.get('wall_seconds') in (None, ''):
+            continue
+        name = '{0}.{1}.{2}'.format(record['module'], record['class'],
+                                    record['test'])
+        total, runs = totals.get(name, (0.0, 0))
+        totals[name] = (total + float(record['wall_seconds']), runs + 1)
+    return {name: total / runs for name, (total, runs) in totals.items()}
+
+
+def _shard_assignment(path, count):
+    """
+    Assign the tests of a timings file to ``count`` shards, longest first,
+    each to the shard with the least total duration so far
+
+    This is the longest processing time first heuristic, which keeps the
+    longest shard within 4/3 of the optimum.  Ties are broken by name and
+    shard index, so that every process computes the same assignment.
+    """
+    durations = _load_durations(path)
+    cached = _shard_assignments.get((path, count))
+    if cached and cached[0] is durations:
+        return cached[1]
+    loads = [(0.0, index) for index in range(count)]
+    assignment = {}
+    for name, duration in sorted(durations.items(),
+                                 key=lambda item: (-item[1], item[0])):
+        load, index = heapq.heappop(loads)
+        assignment[name] = index
+        heapq.heappush(loads, (load + duration, index))
+    _shard_assignments[(path, count)] = (durations, assignment)
+    return assignment
+
+
+def set_test_name_patterns(patterns):
+    """
+    Only generate the data driven tests whose names match one of
+    ``patterns`` in the classes decorated from now on.
+
+    This is meant for test runners, to apply the equivalent of ``unittest``'s
+    ``-k`` option before the test modules are imported, so that tests which
+    are not going to be run are not generated in the first place.  Patterns
+    containing a ``*`` are matched against the full name of the test
+    (``module.Class.test_name``) with ``fnmatch``, other patterns are matched
+    as substrings.  Passing ``None`` generates all tests again.
+    """
+    global _test_name_patterns
+    _test_name_patterns = patterns
+
+
+def _get_test_name_patterns():
+    if _test_name_patterns is not None:
+        return _test_name_patterns
+    patterns = os.environ.get(TEST_NAME_PATTERNS_ENV)
+    if patterns:
+        return [pattern.strip() for pattern in patterns.split(',')]
+    return None
+
+
+def _test_selector(cls, shard=None, patterns=None, durations=None,
+                   failures=None):
+    """
+    Return a predicate on the names of the tests generated for a class, or
+    ``None`` if all of them are generated
+
+    If ``failures`` is the path of a state file written by
+    ``record_failures``, the tests that passed last time are left out.
+    """
+    outcomes = _load_outcomes(failures) if failures else {}
+    if not shard and not patterns and not outcomes:
+        return None
+    prefix = '{0}.{1}.'.format(cls.__module__, cls.__qualname__)
+    if patterns:
+        # Same rules as unittest.TestLoader.testNamePatterns
+        patterns = [
+            pattern if '*' in pattern else '*{0}*'.format(pattern)
+            for pattern in patterns
+        ]
+    assignment = {}
+    if shard and durations:
+        assignment = _shard_assignment(durations, shard[1])
+
+    def in_shard(test_name):
+        # Tests without a recorded duration are assigned by hash
+        index = assignment.get(prefix + test_name)
+        if index is None:
+            return _in_shard(test_name, shard)
+        return index == shard[0]
+
+    def select(test_name, sharded=True):
+        if outcomes.get(prefix + test_name) == 'passed':
+            return False
+        if shard and sharded and not in_shard(test_name):
+            return False
+        return not patterns or any(
+            fnmatch.fnmatchcase(prefix + test_name, pattern)
+            for pattern in patterns
+        )
+    select.shard = shard
+    return select
+
+
+def _is_primitive(obj):
+    """Finds out if the obj is a "primitive". It is somewhat hacky but it works.
+    """
+    return not hasattr(obj, '__dict__')
+
+
+def _get_test_data_docstring(func, value):
+    """Returns a docstring based on the following resolution strategy:
+    1. Passed value is not a "primitive" and has a docstring, then use it.
+    2. In all other cases return None, i.e the test name is used.
+    """
+    if not _is_primitive(value) and value.__doc__:
+        return value.__doc__
+    else:
+        return None
+
+
+def ddt(arg=None, **kwargs):
+    """
+    Class decorator for subclasses of ``unittest.TestCase``.
+
+    Apply this decorator to the test case class, and then
+    decorate test methods with ``@data``.
+
+    For each method decorated with ``@data``, this will effectively create as
+    many methods as data items are passed as parameters to ``@data``.
+
+    The names of the test methods follow the pattern
+    ``original_test_name_{ordinal}_{data}``. ``ordinal`` is the position of the
+    data argument, starting with 1.
+
+    For data we use a string representation of the data value converted into a
+    valid python identifier.  If ``data.__name__`` exists, we use that instead.
+
+    For each method decorated with ``@file_data('test_data.json')``, the
+    decorator will try to load the test_data.json file located relative
+    to the python file containing the method that is decorated. It will,
+    for each ``test_name`` key create as many methods in the list of values
+    from the ``data`` key.
+
+    Decorating with the keyword argument ``testNameFormat`` can control the
+    format of the generated test names.  For example:
+
+    - ``@ddt(testNameFormat=TestNameFormat.DEFAULT)`` will be index and values.
+
+    - ``@ddt(testNameFormat=TestNameFormat.INDEX_ONLY)`` will be index only.
+
+    - ``@ddt`` is the same as DEFAULT.
+
+    Decorating with ``lazy=True`` defers building the generated test methods
+    until a test case instance looks them up, e.g. when the test is run.  The
+    class then only holds a lightweight placeholder per generated test name,
+    which keeps import time and memory low for very large data sets.
+
+    Decorating with ``shard=(index, count)`` only generates the tests that
+    belong to shard ``index`` (counting from 0) out of ``count`` shards, so
+    that a test suite can be split between several machines.  Tests are
+    assigned to shards by a stable hash of their name.  The shard can also
+    be given as ``index/count`` in the ``DDT_SHARD`` environment variable.
+    Test methods that are not data driven are not sharded.
+
+    Decorating with ``durations`` set to the path of a timings file written
+    by ``record_timings`` in a previous run balances the shards by the
+    recorded test durations instead: the tests of the file are packed into
+    shards longest first, each going to the shard with the least total
+    duration so far.  Tests missing from the file are assigned by hash.  The
+    path can also be given in the ``DDT_DURATIONS`` environment variable.
+    Use ``HistoryTestLoader`` to also run the slowest tests of each shard
+    first.
+
+    Decorating with ``failed_only=True``, or setting the ``DDT_FAILED_ONLY``
+    environment variable, only generates the tests that did not pass last
+    time according to the state file of ``record_failures``.  Tests that
+    are not in the state file yet are generated.
+
+    Decorating with ``test_name_patterns`` only generates the tests whose
+    full name (``module.Class.test_name``) matches one of the patterns, using
+    the rules of ``unittest``'s ``-k`` option.  This defaults to the patterns
+    set with ``set_test_name_patterns`` or, failing that, to the
+    comma-separated patterns in the ``DDT_TEST_NAME_PATTERNS`` environment
+    variable.
+
+    Decorating with ``threads=N`` runs the tests generated for each data
+    driven method concurrently, as if it was decorated with
+    ``@concurrently(N)``, unless the method has its own ``@concurrently``.
+
+    Decorating with ``collapse=True`` collapses every data driven method as
+    if it was decorated with ``@collapse``.
+
+    The time taken to decorate the class can be profiled, see
+    ``add_profile_listener``.
+
+    """
+    fmt_test_name = kwargs.get("testNameFormat", TestNameFormat.DEFAULT)
+    lazy = kwargs.get("lazy", False)
+    shard = kwargs.get("shard", os.environ.get(SHARD_ENV))
+    if shard:
+        shard = _parse_shard(shard)
+    patterns = kwargs.get("test_name_patterns", _get_test_name_patterns())
+    durations = kwargs.get("durations", os.environ.get(DURATIONS_ENV))
+    failed_only = kwargs.get("failed_only", os.environ.get(FAILED_ONLY_ENV))
+    threads = kwargs.get("threads")
+    collapse = kwargs.get("collapse", False)
+
+    def wrapper(cls):
+        failures = _get_failures_path() if failed_only else None
+        select = _test_selector(cls, shard, patterns, durations, failures)
+        concurrent = []
+
+        def method_tests(name, func, lazy=lazy, stats=None):
+            return _method_tests(cls, name, func, fmt_test_name, lazy, select,
+                                 stats)
+
+        def add_tests(name, func, stats=None):
+            if collapse or hasattr(func, COLLAPSE_ATTR):
+                setattr(cls, name, _collapsed_test(func, partial(
+                    method_tests, name, func, lazy=False
+                )))
+                return 1
+            tests = method_tests(name, func, stats=stats)
+            concurrency = threads or hasattr(func, CONCURRENCY_ATTR)
+            if concurrency:
+                limit = getattr(func, CONCURRENCY_ATTR, threads)
+                tests = _concurrent_tests(tests, limit)
+            count = 0
+            for test in tests:
+                built = test if lazy or concurrency else test.build()
+                setattr(cls, test.name, built)
+                count += 1
+            if concurrency and count:
+                concurrent.append(test.cases)
+            delattr(cls, name)
+            return count
+
+        _add_data_driven_tests(cls, add_tests)
+        if concurrent:
+            _reset_after_class(cls, concurrent)
+        return cls
+
+    # ``arg`` is the unittest's test class when decorating with ``@ddt`` while
+    # it is ``None`` when decorating a test class with ``@ddt(k=v)``.
+    return wrapper(arg) if inspect.isclass(arg) else wrapper
+
+
+def _add_data_driven_tests(cls, add_tests):
+    """
+    Call ``add_tests`` for each data driven method of a class, profiling the
+    decoration of the class if enabled
+
+    ``add_tests(name, func, stats)`` replaces a method with its generated
+    tests and returns how many there are.
+    """
+    profiling = _profiling()
+    start = time.perf_counter()
+    methods = tests = 0
+    for name, func in list(cls.__dict__.items()):
+        if not (hasattr(func, DATA_ATTR) or hasattr(func, FILE_ATTR) or
+                hasattr(func, SQLITE_ATTR)):
+            continue
+        stats = {} if profiling else None
+        method_start = time.perf_counter()
+        count = add_tests(name, func, stats)
+        if profiling:
+            _emit_method_profile(cls, name, stats, count,
+                                 time.perf_counter() - method_start)
+        methods += 1
+        tests += count
+    if profiling:
+        _emit_profile_event(_profile_event(
+            'class', cls, seconds=time.perf_counter() - start,
+            methods=methods, tests=tests
+        ))
+
+
+def named_data(*named_values):
+    """
+    This decorator is to allow for meaningful names to be given to tests that would otherwise use @ddt.data and
+    @ddt.unpack.
+
+    Example of original ddt usage:
+        @ddt.ddt
+        class TestExample(TemplateTest):
+            @ddt.data(
+                [0, 1],
+                [10, 11]
+            )
+            @ddt.unpack
+            def test_values(self, value1, value2):
+                ...
+
+    Example of new usage:
+        @ddt.ddt
+        class TestExample(TemplateTest):
+            @named_data(
+                ['LabelA', 0, 1],
+                ['LabelB', 10, 11],
+            )
+            def test_values(self, value1, value2):
+                ...
+
+    Note that @unpack is not used.
+
+    :param Sequence[Any] | dict[Any,Any] named_values: Each named_value should be a Sequence (e.g. list or tuple) with
+        the name as the first element, or a dictionary with 'name' as one of the keys. The name will be coerced to a
+        string and all other values will be passed unchanged to the test.
+    """
+    values = []
+    for named_value in named_values:
+        if not isinstance(named_value, (Sequence, dict)):
+            raise TypeError(
+                "@named_data expects a Sequence (list, tuple) or dictionary, and not '{}'.".format(type(named_value))
+            )
+
+        value = _NamedDataDict(**named_value) if isinstance(named_value, dict) \
+            else _NamedDataList(named_value[0], *named_value[1:])
+
+        # Remove the __doc__ attribute so @ddt.data doesn't add the NamedData class docstrings to the test name.
+        value.__doc__ = None
+
+        values.append(value)
+
+    def wrapper(func):
+        data(*values)(unpack(func))
+        return func
+
+    return wrapper
+
+
+class DataCase(namedtuple('DataCase', 'module qualname method index name')):
+    """
+    A picklable description of a test case generated by ``ddt``.
+
+    It names the module and qualified name of the test class, the name of
+    the data driven method, the index of the data item the test case runs
+    with, and the name of the generated test method.  Use ``data_case`` to
+    get the description of a test case.
+    """
+    __slots__ = ()
+
+    def load(self):
+        """
+        Import the test class and return an instance running this case
+        """
+        cls = importlib.import_module(self.module)
+        for attr in self.qualname.split('.'):
+            cls = getattr(cls, attr)
+        return cls(self.name)
+
+
+def data_case(test):
+    """
+    Return the ``DataCase`` describing a test case instance, or ``None`` if
+    it does not run a test generated by ``ddt`` or if its class cannot be
+    imported by name (e.g. it has been defined in a function).
+    """
+    cls = type(test)
+    name = getattr(test, '_testMethodName', None)
+    case = getattr(getattr(cls, name, None), CASE_ATTR, None)
+    if case is None or '<locals>' in cls.__qualname__:
+        return None
+    return DataCase(cls.__module__, cls.__qualname__, case[0], case[1], name)
+
+
+class HistoryTestLoader(unittest.TestLoader):
+    """
+    A test loader ordering the tests of each test class by the outcomes and
+    durations recorded in a previous run.
+
+    ``failures`` is the path of a state file written by ``record_failures``,
+    and defaults to the one tests are recorded in.  The tests that failed
+    last time run first.  ``durations`` is the path of a timings file written
+    by ``record_timings``, and defaults to the ``DDT_DURATIONS`` environment
+    variable.  Otherwise, the slowest tests run first unless
+    ``slowest_first`` is false.  Tests missing from the timings file run
+    last, in their usual order.  For example:
+
+    .. code-block:: python
+
+        unittest.main(testLoader=HistoryTestLoader('timings.json'))
+    """
+
+    def __init__(self, durations=None, slowest_first=True, failures=None):
+        super(HistoryTestLoader, self).__init__()
+        self.durations = durations or os.environ.get(DURATIONS_ENV)
+        self.slowest_first = slowest_first
+        self.failures = failures or _get_failures_path()
+
+    def getTestCaseNames(self, testCaseClass):
+        names = super(HistoryTestLoader, self).getTestCaseNames(testCaseClass)
+        prefix = '{0}.{1}.'.format(testCaseClass.__module__,
+                                   testCaseClass.__qualname__)
+        if self.durations:
+            durations = _load_durations(self.durations)
+            known = sorted(
+                (name for name in names if prefix + name in durations),
+                key=lambda name: durations[prefix + name],
+                reverse=self.slowest_first,
+            )
+            names = known + [name for name in names
+                             if prefix + name not in durations]
+        if self.failures:
+            outcomes = _load_outcomes(self.failures)
+            # A stable sort keeps the order of failed and other tests
+            names.sort(key=lambda name: outcomes.get(prefix + name) != 'failed')
+        return names
+
+
+class ProcessPoolSuite(unittest.TestSuite):
+    """
+    A test suite running the test cases generated by ``ddt`` in a pool of
+    processes.
+
+    The generated test cases of each test class are split into chunks that
+    are sent to worker processes as ``DataCase`` descriptions, while the
+    other tests of the suite run in the current process.  The outcome of
+    every test case, including the formatted traceback of failures and
+    errors, is then reported to the result the suite is run with, class by
+    class, once the tests run in the current process are done.  For example,
+    to run the tests of a module in as many processes as there are cores:
+
+    .. code-block:: python
+
+        def load_tests(loader, tests, pattern):
+            return ProcessPoolSuite(tests)
+
+    Class and module fixtures are run in every worker process for each chunk
+    of test cases it runs.  Test classes must be importable by name in the
+    worker processes.
+    """
+
+    def __init__(self, tests=(), processes=None, chunks_per_process=4):
+        super(ProcessPoolSuite, self).__init__(tests)
+        self.processes = processes or os.cpu_count() or 1
+        self.chunks_per_process = chunks_per_process
+
+    def run(self, result, debug=False):
+        from concurrent.futures import ProcessPoolExecutor
+
+        local, cases = [], OrderedDict()
+        for test in _iter_tests(self):
+            case = data_case(test)
+            if case is None:
+                local.append(test)
+            else:
+                cases.setdefault(case[:2], []).append((case, test))
+        chunks = self._chunks(cases)
+        with ProcessPoolExecutor(self.processes) as executor:
+            futures = [
+                (executor.submit(_run_data_cases, [c for c, _ in chunk]),
+                 chunk)
+                for chunk in chunks
+            ]
+            unittest.TestSuite(local).run(result, debug)
+            for future, chunk in futures:
+                tests = dict((case.name, test) for case, test in chunk)
+                for name, outcome, details in future.result():
+                    if result.shouldStop:
+                        # Leaving the executor waits for the chunks that
+                        # have started, but not for the others
+                        for pending, _ in futures:
+                            pending.cancel()
+                        return result
+                    _report_outcome(result, tests[name], outcome, details)
+        return result
+
+    def _chunks(self, cases):
+        total = sum(len(class_cases) for class_cases in cases.values())
+        size = max(1, -(-total // (self.processes * self.chunks_per_process)))
+        for class_cases in cases.values():
+            for start in range(0, len(class_cases), size):
+                yield class_cases[start:start + size]
+
+
+def _iter_tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for subtest in _iter_tests(test):
+                yield subtest
+        else:
+            yield test
+
+
+class _RemoteTraceback(Exception):
+    """
+    Stands for an exception raised by a test case run in another process.
+    """
+
+    def __init__(self, tb):
+        super(_RemoteTraceback, self).__init__('\n' + tb)
+
+
+class _OutcomeRecorder(unittest.TestResult):
+    """
+    A test result recording the outcome of each test as picklable data.
+
+    The failures and errors of the subtests of a test are combined into a
+    single outcome, so that the test is reported once, as it is when run
+    locally.
+    """
+
+    def __init__(self):
+        super(_OutcomeRecorder, self).__init__()
+        self.outcomes = []
+        self.current = []
+
+    def _record(self, test, outcome, details=None):
+        self.current.append((outcome, details))
+
+    def stopTest(self, test):
+        super(_OutcomeRecorder, self).stopTest(test)
+        current, self.current = self.current, []
+        if not current:
+            return
+        failed = [(outcome, details) for outcome, details in current
+                  if outcome in ('failure', 'error')]
+        if failed:
+            outcome = 'error' if any(o == 'error' for o, _ in failed) \
+                else 'failure'
+            details = '\n'.join(details for _, details in failed)
+        else:
+            outcome, details = current[-1]
+        self.outcomes.append((test._testMethodName, outcome, details))
+
+    def addSuccess(self, test):
+        self._record(test, 'success')
+
+    def addFailure(self, test, err):
+        self._record(test, 'failure', self._exc_info_to_string(err, test))
+
+    def addError(self, test, err):
+        if isinstance(test, unittest.TestCase):
+            self._record(test, 'error', self._exc_info_to_string(err, test))
+        else:
+            # Class or module fixture failures are reported on the first
+            # test case of the chunk.
+            super(_OutcomeRecorder, self).addError(test, err)
+
+    def addSkip(self, test, reason):
+        self._record(test, 'skip', reason)
+
+    def addExpectedFailure(self, test, err):
+        self._record(test, 'expected_failure',
+                     self._exc_info_to_string(err, test))
+
+    def addUnexpectedSuccess(self, test):
+        self._record(test, 'unexpected_success')
+
+    def addSubTest(self, test, subtest, err):
+        if err is not None:
+            outcome = 'failure' if issubclass(err[0], test.failureException) \
+                else 'error'
+            details = '{0}\n{1}'.format(
+                subtest, self._exc_info_to_string(err, test)
+            )
+            self._record(test, outcome, details)
+
+
+def _run_data_cases(cases):
+    """
+    Run test cases in a worker process of a ``ProcessPoolSuite``
+    """
+    recorder = _OutcomeRecorder()
+    unittest.TestSuite([case.load() for case in cases]).run(recorder)
+    if recorder.errors:
+        details = '\n'.join(tb for _, tb in recorder.errors)
+        recorded = set(name for name, _, _ in recorder.outcomes)
+        recorder.outcomes.extend(
+            (case.name, 'error', details)
+            for case in cases if case.name not in recorded
+        )
+    return recorder.outcomes
+
+
+def _report_outcome(result, test, outcome, details):
+    """
+    Report the outcome of a test case run by a ``ProcessPoolSuite``
+    """
+    if outcome in ('failure', 'error', 'expected_failure'):
+        err = (_RemoteTraceback, _RemoteTraceback(details), None)
+    result.startTest(test)
+    try:
+        if outcome == 'success':
+            result.addSuccess(test)
+        elif outcome == 'failure':
+            result.addFailure(test, err)
+        elif outcome == 'error':
+            result.addError(test, err)
+        elif outcome == 'skip':
+            result.addSkip(test, details)
+        elif outcome == 'expected_failure':
+            result.addExpectedFailure(test, err)
+        else:
+            result.addUnexpectedSuccess(test)
+    finally:
+        result.stopTest(test)
@@ -1,6 +1,9 @@
+import asyncio
+import unittest
+
 import aiounittest
 
-from ddt import ddt, data
+from ddt import ddt, data, collapse, concurrently
 from test.mycode import larger_than_two
 
 
@@ -9,3 +12,72 @@ class TestAsync(aiounittest.AsyncTestCase):
     @data(3, 4, 12, 23)
     async def test_larger_than_two(self, value):
         self.assertTrue(larger_than_two(value))
+
+
+@ddt
+class TestAsyncConcurrently(aiounittest.AsyncTestCase):
+    running = 0
+    max_running = 0
+
+    @concurrently(limit=2)
+    @data(3, 4, 12, 23)
+    async def test_larger_than_two(self, value):
+        cls = type(self)
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        await asyncio.sleep(0.01)
+        cls.running -= 1
+        self.assertTrue(larger_than_two(value))
+        self.assertLessEqual(cls.max_running, 2)
+
+
+def test_concurrently_reports_each_case():
+    """
+    Test that concurrent cases run at once but are reported separately
+    """
+    started = []
+
+    @ddt
+    class Mytest(aiounittest.AsyncTestCase):
+        @concurrently()
+        @data(1, 2, 3, 4)
+        async def test_something(self, value):
+            started.append(value)
+            await asyncio.sleep(0.01)
+            # All the cases have started before any of them completes
+            self.assertEqual(len(started), 4)
+            self.assertNotEqual(value, 3)
+
+    suite = unittest.defaultTestLoader.loadTestsFromTestCase(Mytest)
+    result = unittest.TestResult()
+    suite.run(result)
+
+    assert result.testsRun == 4
+    assert [test.id().rsplit('.', 1)[1] for test, _ in result.failures] == [
+        'test_something_3_3'
+    ]
+    assert not result.errors
+    assert sorted(started) == [1, 2, 3, 4]
+
+
+def test_collapse_coroutine():
+    """
+    Test that coroutine test methods can be collapsed into subtests
+    """
+
+    @ddt
+    class Mytest(aiounittest.AsyncTestCase):
+        @collapse
+        @data(1, 2, 3)
+        async def test_something(self, value):
+            await asyncio.sleep(0)
+            self.assertNotEqual(value, 3)
+
+    suite = unittest.defaultTestLoader.loadTestsFromTestCase(Mytest)
+    result = unittest.TestResult()
+    suite.run(result)
+
+    assert result.testsRun == 1
+    assert [str(test).rsplit(' ', 1)[1] for test, _ in result.failures] == [
+        '[test_something_3_3]'
+    ]
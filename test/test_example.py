@@ -93,6 +93,23 @@ class FooTestCase(unittest.TestCase):
     def test_file_data_json_list(self, value):
         self.assertTrue(is_a_greeting(value))
 
+    @file_data('data/test_data_dict_dict.jsonl')
+    def test_file_data_json_lines_dict(self, start, end, value):
+        self.assertLess(start, end)
+        self.assertLess(value, end)
+        self.assertGreater(value, start)
+
+    @file_data('data/test_data_list.jsonl')
+    def test_file_data_json_lines_list(self, value):
+        self.assertTrue(is_a_greeting(value))
+
+    @file_data('data/test_data_dict_dict.csv', key_column='name',
+               columns={'start': float, 'end': float, 'value': float})
+    def test_file_data_csv(self, name, start, end, value):
+        self.assertLess(start, end)
+        self.assertLess(value, end)
+        self.assertGreater(value, start)
+
     @needs_yaml
     @file_data('data/test_data_dict_dict.yaml')
     def test_file_data_yaml_dict_dict(self, start, end, value):
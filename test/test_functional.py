@@ -1,5 +1,12 @@
+import gzip
+import importlib
+import inspect
 import os
 import json
+import pickle
+import threading
+import time
+import unittest
 from sys import modules
 import pytest
 import six
@@ -9,7 +16,10 @@ try:
 except ImportError:
     import mock
 
-from ddt import ddt, data, file_data, idata, TestNameFormat
+from ddt import (
+    ddt, data, file_data, idata, unpack, TestNameFormat, ProcessPoolSuite,
+    batch, batch_case_names, check_batch, collapse, concurrently
+)
 
 from test.mycode import has_three_elements
 
@@ -563,3 +573,1358 @@ def test_load_yaml_with_python_tag():
     for test in tests:
         method = getattr(obj, test)
         method()
+
+
+def test_ddt_lazy():
+    """
+    Test that ``@ddt(lazy=True)`` only builds the tests once they are used
+    """
+
+    @ddt(lazy=True)
+    class Mytest(object):
+        @data(1, 2, 3)
+        def test_something(self, value):
+            """Doc {0}"""
+            return value
+
+        @file_data('data/test_data_dict.json')
+        def test_file(self, value):
+            return value
+
+    tests = sorted(filter(_is_test, Mytest.__dict__))
+    assert tests == [
+        'test_file_1_unsorted_list',
+        'test_file_2_sorted_list',
+        'test_something_1_1',
+        'test_something_2_2',
+        'test_something_3_3',
+    ]
+    # Looking a test up on the class does not build it
+    assert not inspect.isfunction(Mytest.__dict__['test_something_1_1'])
+    assert callable(getattr(Mytest, 'test_something_1_1'))
+
+    obj = Mytest()
+    assert obj.test_something_2_2() == 2
+    assert obj.test_something_2_2.__doc__ == 'Doc 2'
+    assert inspect.isfunction(Mytest.__dict__['test_something_2_2'])
+    assert not inspect.isfunction(Mytest.__dict__['test_something_3_3'])
+    assert Mytest.test_something_3_3(obj) == 3
+    assert obj.test_file_2_sorted_list() == [15, 12, 50]
+
+
+def test_ddt_lazy_subclass():
+    """
+    Test that lazy tests inherited by a subclass are built on the base class
+    """
+
+    @ddt(lazy=True)
+    class Base(object):
+        @data(1)
+        def test_something(self, value):
+            return value
+
+    class Derived(Base):
+        pass
+
+    assert Derived().test_something_1_1() == 1
+    assert inspect.isfunction(Base.__dict__['test_something_1_1'])
+    assert 'test_something_1_1' not in Derived.__dict__
+
+
+def test_file_data_json_lines():
+    """
+    Test that ``file_data`` creates one test per JSON Lines record
+    """
+
+    @ddt
+    class Mytest(object):
+        @file_data('data/test_data_list.jsonl')
+        def test_list(self, value):
+            return value
+
+        @file_data('data/test_data_dict_dict.jsonl')
+        def test_dict(self, start, end, value):
+            return start, end, value
+
+    tests = sorted(filter(_is_test, Mytest.__dict__))
+    assert tests == [
+        'test_dict_1',
+        'test_dict_2',
+        'test_dict_3',
+        'test_dict_4',
+        'test_list_1_Hello',
+        'test_list_2_Goodbye',
+    ]
+    obj = Mytest()
+    assert obj.test_list_2_Goodbye() == 'Goodbye'
+    assert obj.test_dict_3() == (0.0, 1.0, 0.5)
+
+
+def test_file_data_csv(tmp_path):
+    """
+    Test that ``file_data`` creates one test per row of CSV and TSV files
+    """
+    data_file = tmp_path / 'cases.tsv'
+    data_file.write_bytes(b'id\tcount\tlabel\n'
+                          b'first\t1\tone\n'
+                          b'\n'
+                          b'second\t2\t"two\ttabs"\n'
+                          b'\n')
+
+    @ddt
+    class Mytest(object):
+        @file_data('data/test_data_dict_dict.csv')
+        def test_csv(self, name, start, end, value):
+            return name, start, end, value
+
+        @file_data(str(data_file), columns={'count': int}, key_column='id')
+        def test_tsv(self, **kwargs):
+            return kwargs
+
+    tests = sorted(filter(_is_test, Mytest.__dict__))
+    assert tests == [
+        'test_csv_1',
+        'test_csv_2',
+        'test_csv_3',
+        'test_csv_4',
+        'test_tsv_1_first',
+        'test_tsv_2_second',
+    ]
+    obj = Mytest()
+    assert obj.test_csv_3() == ('half', '0.0', '1.0', '0.5')
+    assert obj.test_tsv_2_second() == \
+        {'id': 'second', 'count': 2, 'label': 'two\ttabs'}
+
+    with pytest.raises(ValueError):
+        @ddt
+        class Missing(object):
+            @file_data(str(data_file), key_column='name')
+            def test_tsv(self, **kwargs):
+                return kwargs
+
+    data_file.write_bytes(b'id\tcount\tlabel\nfirst\t1\tone\nsecond\t2\n')
+    with pytest.raises(ValueError, match='line 3: 2 fields'):
+        @ddt
+        class Short(object):
+            @file_data(str(data_file))
+            def test_tsv(self, **kwargs):
+                return kwargs
+
+
+@pytest.mark.parametrize('source', [
+    'data/test_data_dict_dict.json', 'data/test_data_list.yaml',
+])
+def test_file_data_case_store(tmp_path, source):
+    """
+    Test that case stores generate the same tests as their source, reading
+    the data items only when the tests run
+    """
+    from ddt import make_case_store
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    store = str(tmp_path / 'cases.ddtcases')
+    make_case_store(os.path.join(here, source), store)
+
+    def make_class(path):
+        @ddt
+        class Mytest(object):
+            @file_data(path)
+            def test_something(self, value=None, **kwargs):
+                return value, kwargs
+        return Mytest
+
+    expected = make_class(source)
+    Mytest = make_class(store)
+    tests = sorted(filter(_is_test, Mytest.__dict__))
+    assert tests == sorted(filter(_is_test, expected.__dict__))
+
+    with mock.patch('pickle.loads', side_effect=pickle.loads) as loads:
+        for test in tests:
+            assert getattr(Mytest(), test)() == getattr(expected(), test)()
+    assert loads.call_count == len(tests)
+
+
+def test_file_data_case_store_invalid(tmp_path):
+    """
+    Test that files that are not case stores are rejected
+    """
+    store = tmp_path / 'cases.ddtcases'
+    store.write_bytes(b'[]')
+
+    with pytest.raises(ValueError):
+        @ddt
+        class Mytest(object):
+            @file_data(str(store))
+            def test_something(self, value):
+                return value
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_file_data_glob(tmp_path, processes):
+    """
+    Test that ``file_data`` generates the tests of all the files matching a
+    glob pattern or in a directory, named after the files
+    """
+    cases = tmp_path / 'cases'
+    (cases / 'sub-dir').mkdir(parents=True)
+    (cases / 'first.json').write_bytes(b'{"a": 1, "b": 2}')
+    (cases / 'sub-dir' / 'second.json.gz').write_bytes(
+        gzip.compress(b'["Hello"]')
+    )
+    (cases / 'third.jsonl').write_bytes(b'"x"\n"y"\n')
+    (cases / 'notes.txt').write_bytes(b'not data')
+
+    def generated(pattern):
+        @ddt
+        class Mytest(object):
+            @file_data(pattern, processes=processes)
+            def test_something(self, value):
+                return value
+
+        tests = sorted(filter(_is_test, Mytest.__dict__))
+        if tests == ['test_something_00001_error']:
+            with pytest.raises(ValueError):
+                Mytest().test_something_00001_error()
+            return tests, None
+        return tests, [getattr(Mytest(), test)() for test in tests]
+
+    assert generated(str(cases)) == ([
+        'test_something_first_1_a',
+        'test_something_first_2_b',
+        'test_something_sub_dir_second_1_Hello',
+        'test_something_third_1_x',
+        'test_something_third_2_y',
+    ], [1, 2, 'Hello', 'x', 'y'])
+    assert generated(str(cases / '**' / '*.gz')) == (
+        ['test_something_sub_dir_second_1_Hello'], ['Hello']
+    )
+    assert generated(str(cases / 't*')) == (
+        ['test_something_third_1_x', 'test_something_third_2_y'], ['x', 'y']
+    )
+    assert generated(str(cases / '*.csv')) == (
+        ['test_something_00001_error'], None
+    )
+
+
+def test_file_data_glob_case_store(tmp_path):
+    """
+    Test that the items of a case store matched by a glob after other files
+    are read from their own index in the store
+    """
+    from ddt import CASE_ATTR, make_case_store
+
+    cases = tmp_path / 'cases'
+    cases.mkdir()
+    (cases / 'a.json').write_bytes(b'["a1", "a2"]')
+    source = tmp_path / 'b.json'
+    source.write_bytes(b'["b1", "b2", "b3"]')
+    make_case_store(str(source), str(cases / 'b.ddtcases'))
+
+    @ddt
+    class Mytest(object):
+        @file_data(str(cases / '*'))
+        def test_x(self, value):
+            return value
+
+    obj = Mytest()
+    assert [getattr(obj, 'test_x_b_{0}_b{0}'.format(i))() for i in (1, 2, 3)
+            ] == ['b1', 'b2', 'b3']
+    assert getattr(Mytest.test_x_b_3_b3, CASE_ATTR) == ('test_x', 4)
+
+
+def test_file_data_glob_name_clash(tmp_path):
+    """
+    Test that files giving the same test names make an error test rather
+    than overwrite each other's tests
+    """
+    cases = tmp_path / 'cases'
+    (cases / 'a').mkdir(parents=True)
+    (cases / 'a_b.json').write_bytes(b'{"k": 1}')
+    (cases / 'a' / 'b.json').write_bytes(b'{"k": 2}')
+    (cases / 'c.json').write_bytes(b'{"k": 3}')
+
+    @ddt
+    class Mytest(object):
+        @file_data(str(cases))
+        def test_something(self, value):
+            return value
+
+    tests = sorted(filter(_is_test, Mytest.__dict__))
+    assert tests == [
+        'test_something_00001_error',
+        'test_something_a_b_1_k',
+        'test_something_c_1_k',
+    ]
+    with pytest.raises(ValueError, match='test_something_a_b_1_k'):
+        Mytest().test_something_00001_error()
+
+
+def test_file_data_glob_special_directory(tmp_path):
+    """
+    Test that glob characters in the directory of the test module are not
+    treated as a pattern
+    """
+    directory = tmp_path / 'proj[1]'
+    (directory / 'cases').mkdir(parents=True)
+    (directory / 'cases' / 'x.json').write_bytes(b'["Hello"]')
+    (directory / 'cases' / 'y.jsonl').write_bytes(b'"Goodbye"\n')
+
+    for pattern in ('cases/*.json*', 'cases'):
+        with mock.patch('ddt._source_dir', return_value=str(directory)):
+            @ddt
+            class Mytest(object):
+                @file_data(pattern)
+                def test_something(self, value):
+                    return value
+
+        assert sorted(filter(_is_test, Mytest.__dict__)) == [
+            'test_something_x_1_Hello', 'test_something_y_1_Goodbye',
+        ]
+
+
+def test_file_data_json_lines_lazy():
+    """
+    Test that lazily generated JSON Lines tests only keep a file offset
+    """
+
+    @ddt(lazy=True)
+    class Mytest(object):
+        @file_data('data/test_data_dict_dict.jsonl')
+        def test_dict(self, start, end, value):
+            return start, end, value
+
+    placeholder = Mytest.__dict__['test_dict_2']
+    assert placeholder.args == ()
+    assert placeholder.kwargs == {}
+    assert Mytest().test_dict_2() == (-2, 0, -1)
+
+
+def test_file_data_cache(tmp_path):
+    """
+    Test that parsed data files are cached when ``DDT_CACHE_DIR`` is set
+    """
+    from ddt import invalidate_file_data
+
+    def make_class():
+        # Go to the cache rather than to the data interned in memory
+        invalidate_file_data()
+
+        @ddt
+        class Mytest(object):
+            @file_data('data/test_data_dict.yaml')
+            def test_something(self, value):
+                return value
+        return Mytest
+
+    cache_dir = str(tmp_path / 'cache')
+    with mock.patch.dict(os.environ, {'DDT_CACHE_DIR': cache_dir}):
+        cold = make_class()
+        assert len(os.listdir(cache_dir)) == 1
+        with mock.patch('ddt._parse_file_data') as parse:
+            warm = make_class()
+        parse.assert_not_called()
+
+    assert sorted(filter(_is_test, warm.__dict__)) == \
+        sorted(filter(_is_test, cold.__dict__))
+    assert warm().test_something_1_unsorted_list() == [10, 15, 12]
+
+
+@mock.patch.dict('ddt._decoders')
+def test_file_data_cache_decoders(tmp_path):
+    """
+    Test that data files decoded by lambdas or ``functools.partial`` objects
+    are cached apart
+    """
+    import functools
+    from ddt import register_decoder
+
+    register_decoder('.aa', lambda f: json.load(f))
+    register_decoder('.bb', lambda f: [x * 10 for x in json.load(f)])
+    register_decoder('.cc', functools.partial(json.load))
+    for extension in ('.aa', '.bb', '.cc'):
+        (tmp_path / ('data' + extension)).write_bytes(b'[1, 2]')
+
+    def values(extension):
+        @ddt
+        class Mytest(object):
+            @file_data(str(tmp_path / ('data' + extension)))
+            def test_something(self, value):
+                return value
+
+        return sorted(getattr(Mytest(), test)()
+                      for test in filter(_is_test, Mytest.__dict__))
+
+    cache_dir = str(tmp_path / 'cache')
+    with mock.patch.dict(os.environ, {'DDT_CACHE_DIR': cache_dir}):
+        assert values('.aa') == [1, 2]
+        assert values('.bb') == [10, 20]
+        assert values('.cc') == [1, 2]
+
+
+def test_file_data_cache_eviction(tmp_path):
+    """
+    Test that the data file cache evicts entries above ``DDT_CACHE_SIZE``
+    """
+    from ddt import invalidate_file_data
+
+    @ddt
+    class Mytest(object):
+        @file_data('data/test_data_dict.json')
+        def test_first(self, value):
+            return value
+
+        @file_data('data/test_data_list.json')
+        def test_second(self, value):
+            return value
+
+    env = {'DDT_CACHE_DIR': str(tmp_path), 'DDT_CACHE_SIZE': '1'}
+    with mock.patch.dict(os.environ, env):
+        invalidate_file_data()
+        ddt(Mytest)
+    assert os.listdir(str(tmp_path)) == []
+
+
+@mock.patch.dict(os.environ, {'DDT_INTERN_SIZE': '4'})
+def test_file_data_interning(tmp_path):
+    """
+    Test that data files are parsed once for all the methods using them,
+    until they change or are invalidated, if ``DDT_INTERN_SIZE`` is set
+    """
+    from ddt import _parse_file_data, invalidate_file_data
+
+    data_file = tmp_path / 'greetings.json'
+    data_file.write_bytes(b'[[{"a": 1}], [{"a": 2}]]')
+
+    def make_class():
+        @ddt
+        class Mytest(object):
+            @file_data(str(data_file))
+            def test_first(self, value):
+                return value
+
+            @file_data(str(data_file))
+            def test_second(self, value):
+                return value
+
+        return Mytest
+
+    with mock.patch('ddt._parse_file_data',
+                    side_effect=_parse_file_data) as parse:
+        first, second = make_class(), make_class()
+        assert parse.call_count == 1
+        assert first().test_first_1() is second().test_second_1()
+
+        invalidate_file_data(str(data_file))
+        make_class()
+        assert parse.call_count == 2
+
+        data_file.write_bytes(b'[[{"a": 1}]]')
+        assert sorted(filter(_is_test, make_class().__dict__)) == [
+            'test_first_1', 'test_second_1',
+        ]
+        assert parse.call_count == 3
+
+        with mock.patch.dict(os.environ, {'DDT_INTERN_SIZE': '0'}):
+            first, second = make_class(), make_class()
+        assert parse.call_count == 7
+        assert first().test_first_1() is not second().test_first_1()
+        first().test_first_1().append(99)
+        assert second().test_first_1() == [{'a': 1}]
+
+
+def test_fast_yaml_loader():
+    """
+    Test that PyYAML's loaders are swapped for their libyaml equivalents
+    """
+    import yaml
+    from ddt import _fast_yaml_loader
+
+    class CustomLoader(yaml.SafeLoader):
+        pass
+
+    with mock.patch('yaml.__with_libyaml__', True):
+        assert _fast_yaml_loader(yaml.SafeLoader) is yaml.CSafeLoader
+        assert _fast_yaml_loader(yaml.UnsafeLoader) is yaml.CUnsafeLoader
+        assert _fast_yaml_loader(CustomLoader) is CustomLoader
+    with mock.patch('yaml.__with_libyaml__', False):
+        assert _fast_yaml_loader(yaml.SafeLoader) is yaml.SafeLoader
+
+
+@mock.patch.dict('ddt._decoders')
+def test_register_decoder(tmp_path):
+    """
+    Test that ``file_data`` decodes files with the registered decoder
+    """
+    from ddt import register_decoder
+
+    data_file = tmp_path / 'greetings.txt'
+    data_file.write_bytes(b'Hello\nGoodbye\n')
+    register_decoder(('.txt', '.text'),
+                     lambda f: f.read().decode('utf-8').splitlines())
+
+    @ddt
+    class Mytest(object):
+        @file_data(str(data_file))
+        def test_something(self, value):
+            return value
+
+    tests = sorted(filter(_is_test, Mytest.__dict__))
+    assert tests == ['test_something_1_Hello', 'test_something_2_Goodbye']
+
+
+@pytest.mark.parametrize('compress, extension', [
+    ('gzip', '.json.gz'), ('bz2', '.yaml.bz2'), ('lzma', '.jsonl.xz'),
+    ('gzip', '.json'),
+])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_file_data_compressed(tmp_path, compress, extension, lazy):
+    """
+    Test that compressed data files are decompressed, by extension or not
+    """
+    content = {
+        '.json.gz': b'["Hello", "Goodbye"]',
+        '.yaml.bz2': b'- Hello\n- Goodbye\n',
+        '.jsonl.xz': b'"Hello"\n"Goodbye"\n',
+        '.json': b'["Hello", "Goodbye"]',
+    }[extension]
+    data_file = tmp_path / ('greetings' + extension)
+    data_file.write_bytes(importlib.import_module(compress).compress(content))
+
+    @ddt(lazy=lazy)
+    class Mytest(object):
+        @file_data(str(data_file))
+        def test_something(self, value):
+            return value
+
+    tests = sorted(filter(_is_test, Mytest.__dict__))
+    assert tests == ['test_something_1_Hello', 'test_something_2_Goodbye']
+    assert Mytest().test_something_2_Goodbye() == 'Goodbye'
+
+
+def test_json_loads_fallback():
+    """
+    Test that JSON the fast decoders reject is decoded by ``json``
+    """
+    from ddt import _json_loads
+
+    assert _json_loads(b'{"a": [1, 2.5]}') == {'a': [1, 2.5]}
+    assert _json_loads(b'[%d]' % 2 ** 70) == [2 ** 70]
+    value = _json_loads(b'[NaN]')[0]
+    assert value != value
+
+
+def test_mk_test_names():
+    """
+    Test that ``mk_test_names`` generates the names ``mk_test_name`` does
+    """
+    from ddt import mk_test_name, mk_test_names, _NamedDataList
+
+    shared = ('x', 1)
+    values = [
+        1, -2.5, True, None, 'a b-c', 'snow\N{SNOWMAN}man', '', '1st',
+        'under_score', (1, 'a', [None, shared]), [shared, shared],
+        (1, object()), {'a': 1}, object(), _NamedDataList('named', 1),
+    ]
+    for name in ('test_something', '1test', 'test it', 'a%b', '{0}'):
+        for fmt in TestNameFormat:
+            for index_len in (1, 3):
+                expected = [
+                    mk_test_name(name, value, i, index_len, fmt)
+                    for i, value in enumerate(values)
+                ]
+                assert mk_test_names(name, values, index_len, fmt) == \
+                    expected
+
+    assert mk_test_names('test', iter(range(10))) == [
+        mk_test_name('test', i, i, 2) for i in range(10)
+    ]
+
+
+def _sharded_class(**kwargs):
+    @ddt(**kwargs)
+    class Mytest(object):
+        @idata(range(20))
+        def test_something(self, value):
+            return value
+
+        @file_data('data/test_data_dict_dict.json')
+        def test_file(self, start, end, value):
+            return value
+
+        def test_undecorated(self):
+            pass
+
+    return Mytest
+
+
+def test_ddt_shard():
+    """
+    Test that sharding splits the generated tests between the shards
+    """
+    all_tests = set(filter(_is_test, _sharded_class().__dict__))
+    shards = [
+        set(filter(_is_test, _sharded_class(shard=(i, 3)).__dict__))
+        for i in range(3)
+    ]
+    for shard in shards:
+        assert 'test_undecorated' in shard
+        assert len(shard) < len(all_tests)
+    assert set.union(*shards) == all_tests
+    assert sum(len(shard) for shard in shards) == len(all_tests) + 2
+    with mock.patch.dict(os.environ, {'DDT_SHARD': '2/3'}):
+        assert set(filter(_is_test, _sharded_class().__dict__)) == shards[2]
+
+
+def _write_durations(path, cls, durations):
+    records = [
+        {'module': cls.__module__, 'class': cls.__qualname__, 'test': name,
+         'wall_seconds': seconds}
+        for name, seconds in durations.items()
+    ]
+    with open(path, 'w') as f:
+        json.dump(records, f)
+
+
+def test_ddt_shard_durations(tmp_path):
+    """
+    Test that sharding balances the recorded durations of the tests
+    """
+    all_tests = set(filter(_is_test, _sharded_class().__dict__))
+    durations = {
+        'test_something_{0:02}_{1}'.format(i + 1, i): float(i)
+        for i in range(20)
+    }
+    path = str(tmp_path / 'timings.json')
+    _write_durations(path, _sharded_class(), durations)
+
+    shards = [
+        set(filter(_is_test, _sharded_class(shard=(i, 2),
+                                            durations=path).__dict__))
+        for i in range(2)
+    ]
+    assert set.union(*shards) == all_tests
+    assert sum(len(shard) for shard in shards) == len(all_tests) + 1
+    totals = [sum(durations.get(name, 0) for name in shard)
+              for shard in shards]
+    assert totals == [95, 95]
+    with mock.patch.dict(os.environ, {'DDT_SHARD': '1/2',
+                                      'DDT_DURATIONS': path}):
+        assert set(filter(_is_test, _sharded_class().__dict__)) == shards[1]
+
+    missing = str(tmp_path / 'missing.json')
+    assert set(filter(_is_test, _sharded_class(
+        shard=(0, 2), durations=missing
+    ).__dict__)) == set(filter(_is_test, _sharded_class(
+        shard=(0, 2)
+    ).__dict__))
+
+
+def test_history_test_loader(tmp_path):
+    """
+    Test that ``HistoryTestLoader`` orders tests by their recorded durations
+    """
+    from ddt import HistoryTestLoader
+
+    @ddt
+    class Mytest(unittest.TestCase):
+        @data(1, 2, 3)
+        def test_something(self, value):
+            pass
+
+        def test_other(self):
+            pass
+
+    path = str(tmp_path / 'timings.csv')
+    with open(path, 'w') as f:
+        f.write('module,class,test,wall_seconds\n')
+        for name, seconds in [('test_something_1_1', 2),
+                              ('test_something_2_2', 3),
+                              ('test_something_3_3', 1),
+                              ('test_something_3_3', 7)]:
+            f.write('{0},{1},{2},{3}\n'.format(
+                Mytest.__module__, Mytest.__qualname__, name, seconds
+            ))
+
+    assert HistoryTestLoader(path).getTestCaseNames(Mytest) == [
+        'test_something_3_3', 'test_something_2_2', 'test_something_1_1',
+        'test_other',
+    ]
+    names = HistoryTestLoader(path, slowest_first=False).getTestCaseNames(Mytest)
+    assert names == [
+        'test_something_1_1', 'test_something_2_2', 'test_something_3_3',
+        'test_other',
+    ]
+    assert HistoryTestLoader().getTestCaseNames(Mytest) == \
+        unittest.TestLoader().getTestCaseNames(Mytest)
+
+
+@pytest.mark.parametrize('shard', [(3, 3), (-1, 2), '1', 'a/b', (1, 2, 3)])
+def test_ddt_invalid_shard(shard):
+    """
+    Test that an invalid shard raises a ``ValueError``
+    """
+    with pytest.raises(ValueError):
+        _sharded_class(shard=shard)
+
+
+def test_ddt_test_name_patterns():
+    """
+    Test that only tests matching the test name patterns are generated
+    """
+    from ddt import set_test_name_patterns
+
+    def generated(**kwargs):
+        return sorted(filter(_is_test, _sharded_class(**kwargs).__dict__))
+
+    assert generated(test_name_patterns=['something_1']) == [
+        'test_something_10_9',
+        'test_something_11_10',
+        'test_something_12_11',
+        'test_something_13_12',
+        'test_something_14_13',
+        'test_something_15_14',
+        'test_something_16_15',
+        'test_something_17_16',
+        'test_something_18_17',
+        'test_something_19_18',
+        'test_undecorated',
+    ]
+    assert generated(test_name_patterns=['*.Mytest.test_file_?_*']) == [
+        'test_file_1_positive_integer_range',
+        'test_file_2_negative_integer_range',
+        'test_file_3_positive_real_range',
+        'test_file_4_negative_real_range',
+        'test_undecorated',
+    ]
+    with mock.patch.dict(os.environ, {
+        'DDT_TEST_NAME_PATTERNS': 'test_something_05, real_range'
+    }):
+        assert generated() == [
+            'test_file_3_positive_real_range',
+            'test_file_4_negative_real_range',
+            'test_something_05_4',
+            'test_undecorated',
+        ]
+        set_test_name_patterns(['Mytest.test_something_2'])
+        try:
+            assert generated() == ['test_something_20_19', 'test_undecorated']
+        finally:
+            set_test_name_patterns(None)
+
+
+def test_file_data_json_lines_skips_unselected_records():
+    """
+    Test that JSON Lines objects are not decoded for unselected tests
+    """
+    import ddt as ddt_module
+
+    with mock.patch('ddt._json_loads', wraps=ddt_module._json_loads) as loads:
+        @ddt(test_name_patterns=['test_dict_3'])
+        class Mytest(object):
+            @file_data('data/test_data_dict_dict.jsonl')
+            def test_dict(self, start, end, value):
+                return start, end, value
+
+    assert loads.call_count == 1
+    assert sorted(filter(_is_test, Mytest.__dict__)) == ['test_dict_3']
+    assert Mytest().test_dict_3() == (0.0, 1.0, 0.5)
+
+
+@ddt
+class ProcessPoolDummy(unittest.TestCase):
+    """
+    Dummy class to run in a ``ProcessPoolSuite``
+    """
+    __test__ = False
+
+    @data(1, 2, 3, 4, 5, 6)
+    def test_something(self, value):
+        if value == 4:
+            raise KeyError(value)
+        if value == 5:
+            self.skipTest('five')
+        if value == 6:
+            for i in (1, 2):
+                with self.subTest(i=i):
+                    self.assertNotEqual(value, 6)
+        self.assertNotEqual(value, 2)
+        self.assertNotEqual(os.getpid(), getattr(self, 'pid', None))
+
+    def test_undecorated(self):
+        self.assertEqual(os.getpid(), self.pid)
+
+
+def test_process_pool_suite():
+    """
+    Test that ``ProcessPoolSuite`` runs generated tests in other processes
+    """
+    from ddt import data_case
+
+    ProcessPoolDummy.pid = os.getpid()
+    tests = unittest.defaultTestLoader.loadTestsFromTestCase(ProcessPoolDummy)
+    assert data_case(ProcessPoolDummy('test_something_1_1')) == (
+        'test.test_functional', 'ProcessPoolDummy', 'test_something', 0,
+        'test_something_1_1'
+    )
+    assert data_case(ProcessPoolDummy('test_undecorated')) is None
+
+    result = unittest.TestResult()
+    ProcessPoolSuite(tests, processes=2)(result)
+
+    assert result.testsRun == 7
+    assert [test._testMethodName for test, _ in result.failures] == [
+        'test_something_2_2', 'test_something_6_6'
+    ]
+    assert 'AssertionError: 2 == 2' in result.failures[0][1]
+    assert '(i=1)' in result.failures[1][1]
+    assert '(i=2)' in result.failures[1][1]
+    assert [test._testMethodName for test, _ in result.errors] == [
+        'test_something_4_4'
+    ]
+    assert 'KeyError: 4' in result.errors[0][1]
+    assert [(test._testMethodName, reason)
+            for test, reason in result.skipped] == [
+        ('test_something_5_5', 'five')
+    ]
+
+
+def _run_test_case(cls):
+    tests = unittest.defaultTestLoader.loadTestsFromTestCase(cls)
+    result = unittest.TestResult()
+    tests.run(result)
+    return result
+
+
+def test_concurrently_threads():
+    """
+    Test that ``concurrently`` runs the cases of a method in threads
+    """
+    barrier = threading.Barrier(3, timeout=5)
+
+    @ddt
+    class Mytest(unittest.TestCase):
+        @concurrently(3)
+        @data(1, 2, 3)
+        def test_something(self, value):
+            # Only passes once the three cases wait at the same time
+            barrier.wait()
+            self.assertNotEqual(value, 2)
+
+    result = _run_test_case(Mytest)
+    assert result.testsRun == 3
+    assert [test._testMethodName for test, _ in result.failures] == [
+        'test_something_2_2'
+    ]
+    assert not result.errors
+
+
+def test_concurrently_loaded_cases():
+    """
+    Test that only the loaded cases run concurrently, and that the outcomes
+    of cases that did not report are forgotten once the class is done
+    """
+    calls = []
+
+    @ddt
+    class Mytest(unittest.TestCase):
+        @concurrently()
+        @data(1, 2, 3)
+        def test_something(self, value):
+            calls.append(value)
+
+    loader = unittest.TestLoader()
+    loader.testNamePatterns = ['*test_something_1*']
+    result = unittest.TestResult()
+    loader.loadTestsFromTestCase(Mytest).run(result)
+    assert result.testsRun == 1
+    assert calls == [1]
+
+    # Cases 2 and 3 run with case 1 but are not reported
+    Mytest('test_something_2_2'), Mytest('test_something_3_3')
+    unittest.TestSuite([Mytest('test_something_1_1')]).run(result)
+    assert sorted(calls) == [1, 1, 2, 3]
+
+    unittest.TestSuite([Mytest('test_something_2_2')]).run(result)
+    assert sorted(calls) == [1, 1, 2, 2, 3]
+    assert result.wasSuccessful()
+
+
+def test_ddt_threads():
+    """
+    Test that ``@ddt(threads=N)`` bounds the threads running the cases
+    """
+    lock = threading.Lock()
+    running = []
+
+    @ddt(threads=2)
+    class Mytest(unittest.TestCase):
+        @data(*range(8))
+        def test_something(self, value):
+            with lock:
+                running.append(value)
+                assert len(running) <= 2
+            time.sleep(0.01)
+            with lock:
+                running.remove(value)
+
+        @concurrently()
+        @data(1, 2)
+        def test_other(self, value):
+            pass
+
+    result = _run_test_case(Mytest)
+    assert result.testsRun == 10
+    assert result.wasSuccessful()
+
+
+def test_collapse():
+    """
+    Test that ``collapse`` runs the data items as subtests of one test
+    """
+
+    @ddt
+    class Mytest(unittest.TestCase):
+        @collapse
+        @idata(iter(['a', 'b', 'c']), index_len=1)
+        def test_something(self, value):
+            """Docstring"""
+            self.assertNotEqual(value, 'b')
+
+        @collapse
+        @file_data('data/test_data_dict_dict.json')
+        def test_file(self, start, end, value):
+            self.assertGreater(value, 0)
+
+    assert sorted(filter(_is_test, Mytest.__dict__)) == [
+        'test_file', 'test_something'
+    ]
+    assert Mytest.test_something.__doc__ == 'Docstring'
+
+    for _ in range(2):
+        result = _run_test_case(Mytest)
+        assert result.testsRun == 2
+        assert sorted(str(test) for test, _ in result.failures) == [
+            'test_file (test.test_functional.{0}.test_file) '
+            '[test_file_2_negative_integer_range]'.format(Mytest.__qualname__),
+            'test_file (test.test_functional.{0}.test_file) '
+            '[test_file_4_negative_real_range]'.format(Mytest.__qualname__),
+            'test_something (test.test_functional.{0}.test_something) '
+            '[test_something_2_b]'.format(Mytest.__qualname__),
+        ]
+
+
+def test_ddt_collapse():
+    """
+    Test that ``@ddt(collapse=True)`` collapses every data driven method
+    """
+
+    @ddt(collapse=True, test_name_patterns=['test_something_1'])
+    class Mytest(unittest.TestCase):
+        @data(1, 2)
+        def test_something(self, value):
+            self.assertEqual(value, 1)
+
+        @data(1, 2)
+        def test_other(self, value):
+            self.fail()
+
+    result = _run_test_case(Mytest)
+    assert result.testsRun == 2
+    assert result.wasSuccessful()
+
+
+def test_batch():
+    """
+    Test that ``batch`` passes the data items to the test column-wise
+    """
+    batches = []
+
+    @ddt
+    class Mytest(unittest.TestCase):
+        @batch(size=2)
+        @data((1, 2), (2, 4), (3, 5), (4, 8), (5, 10))
+        @unpack
+        def test_double(self, values, expected):
+            batches.append((batch_case_names(self), values, expected))
+            check_batch(self, [v * 2 == e for v, e in zip(values, expected)])
+
+        @batch()
+        @file_data('data/test_data_dict_dict.json')
+        def test_file(self, start, end, value):
+            batches.append((batch_case_names(self), start, end, value))
+
+    assert sorted(filter(_is_test, Mytest.__dict__)) == [
+        'test_double_1', 'test_double_2', 'test_double_3', 'test_file_1'
+    ]
+    result = _run_test_case(Mytest)
+    assert result.testsRun == 4
+    assert [str(test).rsplit(' ', 1)[1] for test, _ in result.failures] == [
+        '[test_double_3__3__5_]'
+    ]
+    assert batches == [
+        (['test_double_1__1__2_', 'test_double_2__2__4_'], [1, 2], [2, 4]),
+        (['test_double_3__3__5_', 'test_double_4__4__8_'], [3, 4], [5, 8]),
+        (['test_double_5__5__10_'], [5], [10]),
+        ([
+            'test_file_1_positive_integer_range',
+            'test_file_2_negative_integer_range',
+            'test_file_3_positive_real_range',
+            'test_file_4_negative_real_range',
+        ], [0, -2, 0.0, -1.0], [2, 0, 1.0, 0.0], [1, -1, 0.5, -0.5]),
+    ]
+
+
+def test_check_batch_outside_batch():
+    """
+    Test that ``check_batch`` rejects tests not running a batch
+    """
+
+    class Mytest(unittest.TestCase):
+        def runTest(self):
+            pass
+
+    with pytest.raises(TypeError):
+        check_batch(Mytest(), [True])
+
+
+@mock.patch('ddt._timing_records', [])
+@mock.patch('atexit.register')
+def test_record_timings(register, tmp_path):
+    """
+    Test that the time each generated test takes is recorded and written
+    """
+    import csv
+    import tracemalloc
+    from ddt import record_timings, write_timings
+
+    path = str(tmp_path / 'timings.json')
+    record_timings(path, memory=True)
+    try:
+        @ddt
+        class Mytest(unittest.TestCase):
+            @data(1, 2)
+            def test_something(self, value):
+                self.assertEqual(value, 1)
+
+            @file_data('data/test_data_list.json')
+            def test_file(self, value):
+                pass
+    finally:
+        record_timings(None)
+
+    register.assert_called_once_with(write_timings, path)
+    _run_test_case(Mytest)
+    assert not tracemalloc.is_tracing()
+    write_timings(path)
+    with open(path) as f:
+        records = sorted(json.load(f), key=lambda r: r['test'])
+
+    assert [(r['test'], r['method'], r['index'], r['data_file'], r['outcome'])
+            for r in records] == [
+        ('test_file_1_Hello', 'test_file', 0, 'data/test_data_list.json',
+         'success'),
+        ('test_file_2_Goodbye', 'test_file', 1, 'data/test_data_list.json',
+         'success'),
+        ('test_something_1_1', 'test_something', 0, None, 'success'),
+        ('test_something_2_2', 'test_something', 1, None, 'AssertionError'),
+    ]
+    for record in records:
+        assert record['class'] == Mytest.__qualname__
+        assert record['wall_seconds'] >= 0
+        assert record['cpu_seconds'] >= 0
+        assert record['peak_memory_bytes'] >= 0
+
+    csv_path = str(tmp_path / 'timings-{pid}.csv')
+    write_timings(csv_path)
+    with open(csv_path.format(pid=os.getpid())) as f:
+        assert len(list(csv.DictReader(f))) == 4
+
+    # Tracing started before is left running
+    tracemalloc.start()
+    try:
+        _run_test_case(Mytest)
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+@mock.patch('atexit.register')
+def test_record_timings_environment(register):
+    """
+    Test that timings are recorded when ``DDT_TIMINGS`` is set
+    """
+
+    with mock.patch.dict(os.environ, {'DDT_TIMINGS': 'env-timings.json'}):
+        @ddt
+        class Mytest(object):
+            @data(1)
+            def test_something(self, value):
+                return value
+
+    register.assert_called_once()
+    assert Mytest().test_something_1_1() == 1
+
+
+def test_profile_listener():
+    """
+    Test that profile listeners get an event per class, method and data file
+    """
+    from ddt import (
+        add_profile_listener, invalidate_file_data, remove_profile_listener,
+    )
+
+    invalidate_file_data()
+    events = []
+    add_profile_listener(events.append)
+    try:
+        @ddt
+        class Mytest(object):
+            @data(1, 2, 3)
+            def test_something(self, value):
+                return value
+
+            @file_data('data/test_data_dict.json')
+            def test_file(self, value):
+                return value
+
+            def test_other(self):
+                pass
+    finally:
+        remove_profile_listener(events.append)
+
+    by_kind = {}
+    for event in events:
+        assert event['module'] == Mytest.__module__
+        assert event['class'] == Mytest.__qualname__
+        by_kind.setdefault(event['event'], []).append(event)
+
+    assert by_kind['class'][0]['methods'] == 2
+    assert by_kind['class'][0]['tests'] == 5
+    assert sorted((e['method'], e['tests']) for e in by_kind['method']) == [
+        ('test_file', 2), ('test_something', 3),
+    ]
+    data_file, = by_kind['data_file']
+    assert data_file['method'] == 'test_file'
+    assert data_file['path'].endswith('test_data_dict.json')
+    assert data_file['items'] == data_file['tests'] == 2
+    assert data_file['bytes'] == os.path.getsize(data_file['path'])
+    assert data_file['cached'] is False
+    for key in ('read_seconds', 'parse_seconds', 'generate_seconds'):
+        assert data_file[key] >= 0
+
+
+def test_profile_environment(tmp_path):
+    """
+    Test that profile events are appended to the ``DDT_PROFILE`` file
+    """
+
+    path = tmp_path / 'profile.jsonl'
+    with mock.patch.dict(os.environ, {'DDT_PROFILE': str(path)}):
+        @ddt
+        class Mytest(object):
+            @file_data('data/test_data_list.jsonl')
+            def test_something(self, value):
+                return value
+
+    with open(str(path)) as f:
+        events = [json.loads(line) for line in f]
+    assert [e['event'] for e in events] == ['data_file', 'method', 'class']
+    assert events[0]['items'] == 2
+    assert events[0]['read_seconds'] is None
+
+
+@mock.patch('atexit.register')
+def test_record_failures(register, tmp_path):
+    """
+    Test that failed tests are recorded, run first and can be run alone
+    """
+    from ddt import HistoryTestLoader, record_failures, write_failures
+
+    path = str(tmp_path / 'failures.json')
+
+    def make_class(**kwargs):
+        @ddt(**kwargs)
+        class Mytest(unittest.TestCase):
+            @data(1, 2, 3)
+            def test_something(self, value):
+                self.assertNotEqual(value, 2)
+
+            @data(4)
+            def test_skipped(self, value):
+                self.skipTest('skipped')
+
+            @batch()
+            @data(5, 6)
+            def test_batch(self, values):
+                check_batch(self, [value != 6 for value in values])
+
+        return Mytest
+
+    record_failures(path)
+    try:
+        Mytest = make_class()
+        _run_test_case(Mytest)
+        write_failures(path)
+        register.assert_called_once_with(write_failures, path)
+
+        prefix = '{0}.{1}.'.format(Mytest.__module__, Mytest.__qualname__)
+        with open(path) as f:
+            assert json.load(f) == {
+                prefix + 'test_something_1_1': 'passed',
+                prefix + 'test_something_2_2': 'failed',
+                prefix + 'test_something_3_3': 'passed',
+                prefix + 'test_batch_1': 'failed',
+            }
+        assert HistoryTestLoader().getTestCaseNames(Mytest) == [
+            'test_batch_1', 'test_something_2_2', 'test_skipped_1_4',
+            'test_something_1_1', 'test_something_3_3',
+        ]
+        assert sorted(filter(_is_test, make_class(failed_only=True).__dict__)) \
+            == ['test_batch_1', 'test_skipped_1_4', 'test_something_2_2']
+    finally:
+        record_failures(None)
+
+
+@mock.patch('atexit.register')
+def test_cache_results(register, tmp_path):
+    """
+    Test that tests which passed with the same data and code are skipped
+    """
+    from ddt import cache_results, write_result_cache
+
+    path = str(tmp_path / 'results.json')
+
+    def make_class():
+        @ddt
+        class Mytest(unittest.TestCase):
+            @data(1, 2, 3)
+            def test_something(self, value):
+                self.assertNotEqual(value, 2)
+
+            @batch()
+            @data(4, 5)
+            def test_batch(self, values):
+                check_batch(self, [value != 5 for value in values])
+
+        return Mytest
+
+    def run(salt):
+        cache_results(path, salt)
+        try:
+            result = _run_test_case(make_class())
+        finally:
+            cache_results(None)
+        write_result_cache(path)
+        return ([test._testMethodName for test, _ in result.skipped],
+                result.testsRun)
+
+    assert run('1') == ([], 4)
+    register.assert_called_once_with(write_result_cache, path)
+    assert run('1') == (['test_something_1_1', 'test_something_3_3'], 4)
+    assert run('2') == ([], 4)
+    with open(path) as f:
+        assert len(json.load(f)) == 2
+
+
+def _make_database(path):
+    import sqlite3
+
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute('CREATE TABLE cases (id, name, value, suite)')
+        connection.executemany(
+            'INSERT INTO cases VALUES (?, ?, ?, ?)',
+            [(i, 'case{0}'.format(i), i * i, 'odd' if i % 2 else 'even')
+             for i in range(10)]
+        )
+    connection.close()
+
+
+def test_sqlite_data(tmp_path):
+    """
+    Test that ``sqlite_data`` creates one test per row of the query
+    """
+    from ddt import sqlite_data
+
+    path = str(tmp_path / 'cases.db')
+    _make_database(path)
+
+    @ddt
+    class Mytest(object):
+        @sqlite_data(path, 'SELECT name, value FROM cases WHERE suite = ?',
+                     ('odd',), key_column='name', batch_size=2)
+        def test_odd(self, name, value):
+            return name, value
+
+        @sqlite_data(path, 'SELECT value FROM cases WHERE id < 2')
+        def test_first(self, value):
+            return value
+
+        @sqlite_data(str(tmp_path / 'missing.db'), 'SELECT 1')
+        def test_missing(self, value):
+            return value
+
+    tests = sorted(filter(_is_test, Mytest.__dict__))
+    assert tests == [
+        'test_first_1',
+        'test_first_2',
+        'test_missing_00001_error',
+        'test_odd_1_case1',
+        'test_odd_2_case3',
+        'test_odd_3_case5',
+        'test_odd_4_case7',
+        'test_odd_5_case9',
+    ]
+    obj = Mytest()
+    assert obj.test_odd_3_case5() == ('case5', 25)
+    assert obj.test_first_2() == 1
+    with pytest.raises(ValueError):
+        obj.test_missing_00001_error()
+
+
+def test_sqlite_data_terminated(tmp_path):
+    """
+    Test that ``sqlite_data`` queries may end with a semicolon or a comment
+    """
+    from ddt import sqlite_data
+
+    path = str(tmp_path / 'cases.db')
+    _make_database(path)
+
+    @ddt
+    class Mytest(object):
+        @sqlite_data(path, 'SELECT name, value FROM cases WHERE suite = ? '
+                           'ORDER BY id -- odd cases\n;', ('odd',),
+                     key_column='name')
+        def test_odd(self, name, value):
+            return name, value
+
+    assert Mytest().test_odd_3_case5() == ('case5', 25)
+    assert Mytest().test_odd_1_case1() == ('case1', 1)
+
+
+def test_sqlite_data_shard_pushdown(tmp_path):
+    """
+    Test that a ``sqlite_data`` query can select the rows of a shard
+    """
+    from ddt import sqlite_data
+
+    path = str(tmp_path / 'cases.db')
+    _make_database(path)
+
+    def generated(**kwargs):
+        @ddt(**kwargs)
+        class Mytest(object):
+            @sqlite_data(path, 'SELECT id FROM cases '
+                               'WHERE id % :shard_count = :shard_index '
+                               'AND id < :limit', {'limit': 7})
+            def test_something(self, id):
+                return id
+
+        obj = Mytest()
+        return sorted(getattr(obj, test)()
+                      for test in filter(_is_test, Mytest.__dict__))
+
+    assert generated() == list(range(7))
+    assert generated(shard=(0, 3)) == [0, 3, 6]
+    assert generated(shard=(2, 3)) == [2, 5]